@@ -0,0 +1,1770 @@
+import os
+import re
+import json
+import time
+import functools
+import importlib
+import contextlib
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+import numpy as np
+import pandas as pd
+
+
+def window_sums(values, num_rows):
+    """
+    Sum of every window of num_rows consecutive values, taken from one cumulative sum.
+
+    Entry i is the sum of values[i:i + num_rows]. Windows running past the end are left out.
+
+    Parameters
+    ----------
+    values : 1d array-like
+    num_rows : int
+    """
+    values = np.asarray(values, dtype=float)
+    if num_rows > len(values):
+        return np.empty(0)
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    return (csum[num_rows:] - csum[:len(csum) - num_rows])[:len(values)]
+
+
+def find_period_start(df, num_rows, largest=True):
+    """
+    Find the first row of the num_rows long period with the largest (or smallest) total of df.
+
+    The search runs on the cumulative sum of the row totals. Windows that come within the
+    rounding error of the best one are summed again per window, so that ties are broken
+    like a loop over all start rows that keeps the first strictly better sum, starting
+    from 0 for the maximum and 1e50 for the minimum (None if no window beats that).
+
+    Parameters
+    ----------
+    df : pd.DataFrame with the columns to be summed
+    num_rows : int, length of the period in rows
+    largest : bool, search the maximum if True, the minimum otherwise
+
+    Returns
+    -------
+    index label of the first row of the period
+    """
+    total = df.sum(axis=1).to_numpy(dtype=float)
+    sums = window_sums(total, num_rows)
+    if not len(sums):
+        return None
+
+    best = sums.max() if largest else sums.min()
+    tol = 1e-10 * (np.abs(total).sum() + 1.0)
+    candidates = np.flatnonzero(np.abs(sums - best) <= tol)
+
+    best_sum = 0 if largest else 1e50
+    start = None
+    for start_idx in candidates:
+        current_sum = df.iloc[start_idx:start_idx + num_rows].sum().sum()
+        if (current_sum > best_sum) if largest else (current_sum < best_sum):
+            best_sum = current_sum
+            start = df.index[start_idx]
+
+    return start
+
+
+def apply_cut(df, mask, cut_start, cut_end, reductionto, clip=True):
+    """
+    Scale the masked columns of a time series frame inside the cut window, in place.
+
+    All values in the rows from cut_start to cut_end (both included) and the columns
+    selected by mask are multiplied by reductionto in one masked array operation.
+
+    Parameters
+    ----------
+    df : pd.DataFrame indexed by snapshots, e.g. n.generators_t.p_max_pu
+    mask : boolean array over df.columns or list of column names
+    cut_start, cut_end : pd.Timestamp
+    reductionto : float, remaining share of the values inside the window
+    clip : bool, set values that end up negative to 0
+    """
+    mask = np.asarray(mask)
+    if mask.dtype != bool:
+        mask = df.columns.isin(mask)
+    rows = (df.index >= cut_start) & (df.index <= cut_end)
+    if not rows.any() or not mask.any():
+        return df
+
+    values = df.loc[rows, mask].to_numpy(dtype=float) * reductionto
+    if clip:
+        values = np.maximum(values, 0)
+    df.loc[rows, mask] = values
+    return df
+
+
+def extract_carriers(column_names, carriers):
+    """
+    Filters columns that match the specified carrier names.
+
+    Parameters:
+    - column_names: List of column names in the DataFrame.
+    - carriers: List of carrier names to match.
+
+    Returns:
+    - List of column names that match the carriers.
+    """
+    return [col for col in column_names if any(carrier in col for carrier in carriers)]
+
+
+def mod_rh_storage(n1, n, n_base=None):
+    """
+    Modify marginal cost and the initial soc of storage for the rolling horizon model
+
+    marginal cost of the storage unit = MSV, the mean storage value in the perfect foresight model
+
+    initial soc of storage unit in rh models = initial soc of storage units in the long term optimized model
+
+    Parameters
+    ----------
+    n1 : to be edited pypsa.Network (rolling horizon model)
+    n : solved pypsa.Network (perfect foresight)
+    n_base : long term optimized base model, by default n
+    """
+    if n_base is None:
+        n_base = n
+
+    #mean storage value of storage in long term optimization
+    storage_i = n.storage_units.index
+    n1.storage_units.loc[storage_i, 'marginal_cost'] = n.storage_units_t.mu_energy_balance[storage_i].mean()
+
+    #edit initial value
+    soc = n_base.storage_units_t.state_of_charge.iloc[0, :]
+    n1.storage_units.loc[soc.index, 'state_of_charge_initial'] = soc
+
+
+def same_country(df):
+    """
+    Mask of the branches of df (lines or links) connecting two buses of the same country.
+    """
+    return (df.bus0.str[:2] == df.bus1.str[:2]).to_numpy()
+
+
+def set_base_capacities(n1, n, c, extend=None, fix=None, max_factor=None):
+    """
+    Set the capacities of component c of n1 from the optimal capacities of the solved network n.
+
+    Assets in extend are extendable with the optimal capacity of n as minimum and, with
+    max_factor, max_factor times it as maximum. Assets in fix are fixed to the optimal
+    capacity of n.
+
+    Parameters
+    ----------
+    n1 : pypsa.Network to be edited
+    n : solved pypsa.Network
+    c : str, component, e.g. 'Generator'
+    extend : boolean mask over the assets of c, by default none
+    fix : boolean mask over the assets of c, by default all assets not in extend
+    max_factor : float, maximum capacity of extended assets relative to the optimal capacity
+    """
+    from pypsa.descriptors import nominal_attrs
+
+    df = n1.df(c)
+    nominal = nominal_attrs[c]
+    extend = np.zeros(len(df), dtype=bool) if extend is None else np.asarray(extend, dtype=bool)
+    fix = ~extend if fix is None else np.asarray(fix, dtype=bool)
+    optimal = n.df(c)[f'{nominal}_opt'].reindex(df.index)
+
+    extend_i = df.index[extend]
+    df.loc[extend_i, f'{nominal}_min'] = optimal[extend_i]
+    if max_factor is not None:
+        df.loc[extend_i, f'{nominal}_max'] = optimal[extend_i] * max_factor
+    df.loc[extend_i, f'{nominal}_extendable'] = True
+
+    fix_i = df.index[fix]
+    df.loc[fix_i, nominal] = optimal[fix_i]
+    df.loc[fix_i, f'{nominal}_extendable'] = False
+
+
+def allow_inv(n1, n, line_mask=None, link_mask=None):
+    """
+    Allow investments on top of the optimal capacities of the solved base network n.
+
+    Extendable generators and storage units keep expanding from their base capacity, the
+    others are fixed to it. Lines in line_mask (default AC lines) and links in link_mask
+    (default DC links) can expand up to 50% above their base capacity, all other branches
+    are fixed. The line expansion limit of the base network is dropped.
+
+    Parameters
+    ----------
+    n1 : pypsa.Network to be edited
+    n : solved base pypsa.Network
+    line_mask, link_mask : boolean masks over n1.lines and n1.links
+    """
+    #delete line expansion global constraint
+    if 'lv_limit' in n1.global_constraints.index:
+        n1.global_constraints = n1.global_constraints.drop('lv_limit')
+
+    for c in ['Generator', 'StorageUnit']:
+        set_base_capacities(n1, n, c, extend=n1.df(c).p_nom_extendable)
+
+    if line_mask is None:
+        line_mask = n1.lines.carrier == 'AC'
+    if link_mask is None:
+        link_mask = n1.links.carrier == 'DC'
+    set_base_capacities(n1, n, 'Line', extend=line_mask, max_factor=1.5)
+    set_base_capacities(n1, n, 'Link', extend=link_mask, max_factor=1.5)
+
+
+def no_inv(n2, n):
+    """
+    Fix the capacities of all extendable assets of n2 to the optimal capacities of the solved network n.
+    """
+    from pypsa.descriptors import nominal_attrs
+
+    for c in ['Generator', 'StorageUnit', 'Store', 'Line', 'Link']:
+        set_base_capacities(n2, n, c, fix=n2.df(c)[f'{nominal_attrs[c]}_extendable'])
+
+
+def resample_network(n, hours):
+    """
+    Copy of n at a coarser temporal resolution of hours per snapshot.
+
+    Time series, inputs as well as the solution of a solved network, are averaged over each
+    new snapshot and the snapshot weightings are summed, so energies and operational costs
+    keep their annual scale. The name gets the resolution tag _{hours}h.
+    """
+    offset = f'{int(hours)}h'
+    m = n.copy(with_time=False)
+    weightings = n.snapshot_weightings.resample(offset).sum()
+    m.set_snapshots(weightings.index)
+    m.snapshot_weightings = weightings
+    for c in n.iterate_components():
+        pnl = getattr(m, c.list_name + '_t')
+        for attr, df in c.pnl.items():
+            if not df.empty:
+                pnl[attr] = df.resample(offset).mean()
+    m.name = f'{n.name}_{offset}'
+    return m
+
+
+results_tables = ['cap', 'gen', 'capex', 'syscost']
+results_partitions = ['country', 'contingency', 'model']
+
+
+def scenario_keys(name):
+    """
+    Scenario keys of a network from its name.
+
+    Base networks are named {country}_{tl}_base[_roll]_solved, contingency networks
+    {contingency}_{country}_{bus}_{tl}_{reductionto}_{duration}_{model}[roll]. Networks
+    solved at a coarser temporal resolution (see solve_screening.py) end in _{hours}h.
+    """
+    parts = name.split('_')
+    resolution = None
+    if re.fullmatch(r'\d+h', parts[-1]):
+        resolution = parts.pop()
+    if parts[2] == 'base':
+        keys = dict(country=parts[0], bus=None, tl=parts[1], contingency='base', reductionto=None, duration=None, model='base')
+        roll = parts[3] == 'roll'
+    else:
+        contingency, country, bus, tl, reductionto, duration, model = parts
+        roll = model.endswith('roll')
+        keys = dict(country=country, bus=bus, tl=tl, contingency=contingency, reductionto=reductionto,
+                    duration=duration, model=model[:-len('roll')] if roll else model)
+    keys['roll'] = roll
+    keys['resolution'] = resolution
+    keys['scenario'] = name
+    return keys
+
+
+def _long_table(df):
+    """
+    Long form of a carrier x country table or a (carrier, country) x snapshot table.
+    """
+    long = df.stack().rename('value').reset_index()
+    long.columns = ['carrier', 'bus_country'] + (['snapshot'] if isinstance(df.index, pd.MultiIndex) else []) + ['value']
+    return long
+
+
+def write_table(df, table, name, store='csv', root='results/store'):
+    """
+    Write a results table of the network called name.
+
+    csv writes results/{table}_{name}.csv. parquet writes the table in long form with the
+    scenario keys as columns to {root}/{table}/country=../contingency=../model=../{name}.parquet,
+    which replaces an earlier file of the same scenario. both does both.
+
+    Parameters
+    ----------
+    df : pd.DataFrame, table as exported by export_statistics
+    table : str, one of results_tables
+    name : str, network name
+    store : 'csv', 'parquet' or 'both'
+    root : path of the parquet store
+    """
+    if store in ['csv', 'both']:
+        df.to_csv(os.path.join(os.getcwd(), f"results/{table}_{name}.csv"))
+    if store not in ['parquet', 'both']:
+        return
+
+    keys = scenario_keys(name)
+    long = _long_table(df)
+    for key in ['bus', 'tl', 'reductionto', 'duration', 'resolution', 'scenario']:
+        long[key] = pd.Series(keys[key], index=long.index, dtype='string')
+    long['roll'] = keys['roll']
+    partition = os.path.join(root, table, *[f'{key}={keys[key]}' for key in results_partitions])
+    os.makedirs(partition, exist_ok=True)
+    #write to a temporary file first, readers never see a partial file
+    fn = os.path.join(partition, f'{name}.parquet')
+    long.to_parquet(fn + '.tmp', index=False, engine='pyarrow')
+    os.replace(fn + '.tmp', fn)
+
+
+def _store_key(key, value):
+    """
+    A scenario key as stored by write_table: the string in the network name, roll as bool.
+    """
+    if key == 'roll':
+        return bool(value)
+    if key == 'reductionto' and not isinstance(value, str):
+        return str(float(value))
+    return str(value)
+
+
+def read_results(table, root='results/store', columns=None, **filters):
+    """
+    Read a results table from the parquet store.
+
+    Filters on the partition keys (country, contingency, model) skip the files of other
+    partitions, filters on the other scenario keys (bus, tl, reductionto, duration, roll,
+    resolution, scenario) are applied while reading. A filter value may be a single value or a list.
+    Except roll, the keys are stored as the strings of the network name (see write_table),
+    so numbers are compared as such strings, reductionto as float like in the names of
+    the solve scripts (reductionto=0 matches '0.0').
+
+    Example
+    -------
+    read_results('syscost', country='DE', contingency=['pv', 'wind'], roll=False)
+
+    Parameters
+    ----------
+    table : str, one of results_tables
+    root : path of the parquet store
+    columns : list of columns to read, by default all
+    **filters : scenario key = value or list of values
+
+    Returns
+    -------
+    pd.DataFrame in long form with the scenario keys as columns
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(os.path.join(root, table), format='parquet', partitioning='hive')
+    expression = None
+    for key, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        condition = ds.field(key).isin([_store_key(key, v) for v in values])
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def assign_country(n, country):
+    """
+    Add a country column to the generators, storage units, lines and links of n.
+
+    Generators and storage units take the country of their bus. Lines and links touching
+    a bus of country are assigned to country, all others to the country of bus0.
+    """
+    for df in [n.generators, n.storage_units]:
+        df['country'] = df.bus.str[:2]
+    for df in [n.lines, n.links]:
+        touches = df.bus0.str.contains(country, regex=False) | df.bus1.str.contains(country, regex=False)
+        df['country'] = df.bus0.str[:2].where(~touches, country)
+
+
+def export_statistics(n, country, n_perf=0):
+    """
+    Write capacities, generation, capex and system cost of the solved network n by carrier and country.
+
+    For rolling horizon networks (n.name contains 'roll') the opex of storage units is
+    evaluated with their marginal costs in the perfect foresight network n_perf. The tables
+    go to results/ as csv and/or to the parquet store, see write_table.
+
+    Parameters
+    ----------
+    n : solved pypsa.Network
+    country : str, country code of the study region
+    n_perf : solved perfect foresight pypsa.Network, only for rolling horizon networks
+    """
+    comps = ["Generator", "StorageUnit", "Line", "Link", "Transformer"]
+    store = load_config().get('results_store', 'csv')
+    assign_country(n, country)
+
+    def by_country(df):
+        return df.unstack().fillna(0).droplevel(0)
+
+    #export capacity in GW
+    cap = by_country(n.statistics.optimal_capacity(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum")) / 1e3 #GW
+    write_table(cap, "cap", n.name, store)
+
+    gen = n.statistics.supply(comps=["Generator", "StorageUnit"], groupby=["carrier", "country"], aggregate_groups="sum", aggregate_time=False).fillna(0).droplevel(0) / 1e3 #GW
+    write_table(gen, "gen", n.name, store)
+
+    #export system cost in Bill €
+    if 'roll' in n.name:
+        #marginal cost of storage units under perfect foresight is used back to calculate the system cost of storages in RH models
+        marginal_cost = n.storage_units['marginal_cost']
+        n.storage_units['marginal_cost'] = n_perf.storage_units['marginal_cost']
+        try:
+            opex = by_country(n.statistics.opex(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum"))
+        finally:
+            n.storage_units['marginal_cost'] = marginal_cost
+    else:
+        opex = by_country(n.statistics.opex(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum"))
+
+    capex = by_country(n.statistics.capex(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum"))
+    write_table(capex / 1e9, "capex", n.name, store) #Bill€
+
+    #carriers of the network and countries of its generators first, entries without capex are dropped
+    index = n.carriers.index.append(capex.index.difference(n.carriers.index, sort=False)).rename(n.carriers.index.name)
+    countries = pd.Index(n.generators.country.unique())
+    columns = countries.append(capex.columns.difference(countries, sort=False))
+    cost = capex.add(opex, fill_value=0)
+    cost = cost.where(capex.reindex_like(cost).notna())
+    cost = cost.reindex(index=index, columns=columns).dropna()
+    system_cost = cost / 1e9 #Bill€
+    write_table(system_cost, "syscost", n.name, store)
+
+
+def load_config(path=None):
+    """
+    Read the workflow configuration, relative to the workflow directory the scripts are run from.
+
+    The Snakefile passes the configuration Snakemake runs with (config/config.yaml with the
+    --configfile and --config overrides) as the file in WORKFLOW_CONFIG, scripts run by hand
+    read config/config.yaml.
+    """
+    if path is None:
+        path = os.environ.get('WORKFLOW_CONFIG') or 'config/config.yaml'
+    with open(path) as f:
+        return yaml.safe_load(f)
+
+
+def solving_options(config=None):
+    """
+    Options of the solving section of the configuration, with defaults for missing entries.
+    """
+    if config is None:
+        config = load_config()
+    options = {
+        'equity': 'single',
+        'warm_start': False,
+        'severity_sweep': False,
+        'window': {'enable': False, 'buffer_days': 14, 'accuracy_report': False},
+        'rolling_horizon': {'mode': 'sequential', 'processes': None},
+        'export': {'mode': 'full', 'content': 'full', 'complevel': 0, 'shuffle': True, 'float32': False, 'record': False},
+    }
+    for key, value in (config.get('solving') or {}).items():
+        if isinstance(options.get(key), dict):
+            options[key] = {**options[key], **(value or {})}
+        else:
+            options[key] = value
+    return options
+
+
+#names of the thread and memory options of each solver, None if it has no such option
+resource_options = {
+    'gurobi': ('Threads', 'SoftMemLimit'),
+    'highs': ('threads', None),
+}
+
+
+def solver_config(config=None):
+    """
+    Solver section of the configuration, with defaults for missing entries.
+
+    name is the solver of all solves, fallback the solver used when name is gurobi and no
+    usable Gurobi licence is found. io_api is the way linopy passes the model to the solver
+    ('lp' or 'mps' file, 'direct' through the python API of gurobi and highs, None: linopy's
+    default).
+    options holds the solver options of each stage (base, inv, noinv, rolling_horizon) per
+    solver, duals the constraints whose shadow prices are kept in each stage, see stage_duals,
+    and barrier the stages solved with barrier without crossover, see solve_barrier.
+    """
+    if config is None:
+        config = load_config()
+    options = {'name': 'gurobi', 'fallback': 'highs', 'io_api': None, 'options': {}, 'duals': {},
+               'barrier': {'stages': [], 'tol': 1e-5, 'compare': False}}
+    for key, value in (config.get('solver') or {}).items():
+        if key == 'barrier':
+            options[key] = {**options[key], **(value or {})}
+        else:
+            options[key] = value
+    return options
+
+
+@functools.lru_cache(maxsize=None)
+def gurobi_licensed():
+    """
+    Whether gurobipy is installed with a licence that solves models of full size.
+
+    The size-limited licence shipped with the pip package starts an environment, but fails
+    to optimize models with more than 2000 variables, so a model just above that size is
+    solved once.
+    """
+    try:
+        import gurobipy
+        with gurobipy.Env(params={'OutputFlag': 0}) as env, gurobipy.Model(env=env) as m:
+            m.addVars(2001)
+            m.optimize()
+        return True
+    except Exception as e:
+        print(f'gurobi not usable: {e}')
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def solver_name():
+    """
+    Solver of the workflow: the configured solver, or its fallback for gurobi without licence.
+    """
+    options = solver_config()
+    if options['name'] != 'gurobi' or gurobi_licensed():
+        return options['name']
+    if not options['fallback']:
+        raise RuntimeError('gurobi has no usable licence and no fallback solver is configured')
+    print(f"no gurobi licence, solving with {options['fallback']}")
+    return options['fallback']
+
+
+
+@contextlib.contextmanager
+def solver_environment():
+    """
+    Solver environment shared by all solves of a process: a Gurobi environment with gurobi,
+    None with other solvers. The solver bindings are only loaded by the process that solves.
+    """
+    if solver_name() == 'gurobi':
+        import gurobipy
+        with gurobipy.Env() as env:
+            yield env
+    else:
+        yield None
+
+
+#script implementing each contingency
+contingency_scripts = {
+    'pv': 'solve_pv',
+    'wind': 'solve_wind',
+    'windpv': 'solve_windpv',
+    'drought': 'solve_drought',
+    'noexim': 'solve_noexim',
+}
+
+
+def solve_scenario(input_file, output_file, contingency, reductionto, duration, model, country, o, tl, bus, **kwargs):
+    """
+    Solve one contingency scenario with solve_contingencies of its solve_{contingency}.py script.
+
+    The carriers to cut of the script are added, kwargs (the loaded base network n, env,
+    tag, statistics) are passed on to solve_contingencies. Returns the solved network.
+    """
+    script = importlib.import_module(contingency_scripts[contingency])
+    if contingency != 'noexim':
+        kwargs['carriers_to_cut'] = script.carriers_to_cut
+    return script.solve_contingencies(input_file=input_file, output_file=output_file, contingency=contingency,
+                                      reductionto=reductionto, duration=duration, model=model,
+                                      country=country, o=o, tl=tl, bus=bus, **kwargs)
+
+def solver_resources(solver='gurobi'):
+    """
+    Solver options limiting the solver to the threads and memory of the Snakemake job.
+
+    The Snakefile passes the threads and mem_mb of the rule as SOLVER_THREADS and
+    SOLVER_MEM_MB. The soft memory limit (gurobi only) leaves 20% of the job memory to
+    the model building in python.
+    """
+    threads, memory = resource_options.get(solver, (None, None))
+    options = {}
+    if threads and os.environ.get('SOLVER_THREADS'):
+        options[threads] = int(os.environ['SOLVER_THREADS'])
+    if memory and os.environ.get('SOLVER_MEM_MB'):
+        options[memory] = 0.8 * int(os.environ['SOLVER_MEM_MB']) / 1024 #GB
+    return options
+
+
+#shadow prices kept per stage if not configured, the perfect foresight stages keep the storage
+#balance for the marginal storage value of the rolling horizon (mod_rh_storage)
+default_duals = {
+    'base': ['StorageUnit-energy_balance'],
+    'inv': ['StorageUnit-energy_balance'],
+    'noinv': ['StorageUnit-energy_balance'],
+    'rolling_horizon': [],
+}
+
+
+def stage_duals(stage=None):
+    """
+    Constraints whose shadow prices are written to the network in stage, a list of linopy
+    constraint names (e.g. 'StorageUnit-energy_balance') or 'all'. Without stage all duals
+    are kept.
+    """
+    if stage is None:
+        return 'all'
+    duals = solver_config()['duals']
+    return duals[stage] if duals.get(stage) is not None else default_duals.get(stage, 'all')
+
+
+def solver_kwargs(stage=None, **kwargs):
+    """
+    Solver arguments of optimize and solve_model: the workflow's solver and io_api, the duals,
+    resource limits and solver options of stage ('base', 'inv', 'noinv' or 'rolling_horizon'),
+    and the barrier check for the stages solved without crossover.
+    """
+    name = solver_name()
+    config = solver_config()
+    stage_options = ((config['options'].get(name) or {}).get(stage) or {}) if stage else {}
+    solver_options = {**solver_resources(name), **stage_options}
+    #only gurobi and highs have a direct interface in linopy, the others keep linopy's default
+    if config['io_api'] and (config['io_api'] != 'direct' or name in ('gurobi', 'highs')):
+        kwargs.setdefault('io_api', config['io_api'])
+    if stage in config['barrier']['stages']:
+        kwargs.setdefault('barrier', {'tol': config['barrier']['tol'], 'compare': config['barrier']['compare']})
+    return dict(solver_name=name, duals=stage_duals(stage), solver_options=solver_options, **kwargs)
+
+
+def assign_duals(n, duals):
+    """
+    Write the shadow prices of the time dependent constraints named in duals from n.model to
+    n, like pypsa's assign_duals with assign_all_duals, e.g. StorageUnit-energy_balance to
+    storage_units_t.mu_energy_balance. Constraints missing in the model are skipped.
+    """
+    from pypsa.optimization.common import set_from_frame
+
+    m = n.model
+    for name in duals:
+        if name not in m.constraints:
+            continue
+        dual = m.constraints[name].dual
+        if 'snapshot' not in dual.dims:
+            continue
+        c, attr = name.split('-', 1)
+        spec = 'marginal_price' if attr.endswith('nodal_balance') else 'mu_' + attr.rsplit('-', 1)[-1]
+        set_from_frame(n, c, spec, dual.transpose('snapshot', ...).to_pandas())
+
+
+def optimize(n, snapshots=None, duals='all', barrier=None, **kwargs):
+    """
+    n.optimize keeping only the shadow prices of the constraints in duals ('all': all of them).
+
+    pypsa always keeps the nodal prices and the duals of global constraints, the other time
+    dependent duals are only written for the constraints listed, see assign_duals. With
+    barrier (keyword arguments of solve_barrier) the model is solved by solve_barrier.
+    """
+    if barrier is not None:
+        extra_functionality = kwargs.pop('extra_functionality', None)
+        n.optimize.create_model(snapshots)
+        if extra_functionality is not None:
+            extra_functionality(n, n.snapshots if snapshots is None else snapshots)
+        return solve_model(n, duals=duals, barrier=barrier, **kwargs)
+
+    status, condition = n.optimize(snapshots, assign_all_duals=duals == 'all', **kwargs)
+    if status == 'ok' and duals != 'all':
+        assign_duals(n, duals)
+    return status, condition
+
+
+def solve_model(n, duals='all', barrier=None, **kwargs):
+    """
+    n.optimize.solve_model keeping only the shadow prices of the constraints in duals, see optimize.
+    """
+    if barrier is not None:
+        return solve_barrier(n, duals=duals, **barrier, **kwargs)
+
+    status, condition = n.optimize.solve_model(assign_all_duals=duals == 'all', **kwargs)
+    if status == 'ok' and duals != 'all':
+        assign_duals(n, duals)
+    return status, condition
+
+
+#solver options of a barrier solve without crossover
+no_crossover_options = {
+    'gurobi': {'Method': 2, 'Crossover': 0},
+    'highs': {'solver': 'ipm', 'run_crossover': 'off'},
+}
+
+
+def solution_violation(n):
+    """
+    Largest primal or dual violation of the last solve of n reported by the solver (gurobi,
+    highs), NaN if the solver does not report it.
+    """
+    m = n.model.solver_model
+    try:
+        return max(m.ConstrVio, m.BoundVio, m.DualVio)
+    except Exception:
+        pass
+    try:
+        info = m.getInfo()
+        return max(info.max_primal_infeasibility, info.max_dual_infeasibility)
+    except Exception:
+        return np.nan
+
+
+def solve_barrier(n, tol=1e-5, compare=False, **kwargs):
+    """
+    Solve the model of n with barrier without crossover, falling back to the regular solve.
+
+    The investment models only need approximate capacities and the storage duals, which the
+    interior point solution provides, while crossover to a basic solution can take longer
+    than the barrier itself. The barrier solution is kept if the solve ends ok and the
+    largest primal and dual violation reported by the solver is at most tol, otherwise (also
+    if the solver reports no violation) the model is solved again with the regular solver
+    options (with crossover).
+
+    The path taken and the wall times go to results/barrierstats_{n.name}.csv. With compare,
+    the model is first solved with the regular options as reference and the time saved by
+    the path taken is added.
+
+    Parameters
+    ----------
+    n : pypsa.Network with a built model
+    tol : float, largest accepted violation of the barrier solution
+    compare : bool
+    **kwargs : passed on to solve_model
+    """
+    stats = {}
+    if compare:
+        start = time.perf_counter()
+        solve_model(n, **kwargs)
+        stats['reference'] = solver_stats(n, time.perf_counter() - start)
+
+    options = kwargs.pop('solver_options', {})
+    start = time.perf_counter()
+    no_crossover = {**options, **no_crossover_options.get(kwargs.get('solver_name'), {})}
+    status, condition = solve_model(n, solver_options=no_crossover, **kwargs)
+    stats['barrier'] = {**solver_stats(n, time.perf_counter() - start), 'violation': solution_violation(n)}
+    path = 'barrier'
+
+    violation = stats['barrier']['violation']
+    if status != 'ok' or not np.isfinite(violation) or violation > tol:
+        print(f"barrier solution of {n.name} not accepted ({status}, {condition}, violation {violation}), solving with crossover")
+        start = time.perf_counter()
+        status, condition = solve_model(n, solver_options=options, **kwargs)
+        stats['crossover'] = {**solver_stats(n, time.perf_counter() - start), 'violation': solution_violation(n)}
+        path = 'crossover'
+
+    total = sum(stats[key]['wall_time'] for key in ['barrier', 'crossover'] if key in stats)
+    if compare:
+        stats['saving'] = {'wall_time': stats['reference']['wall_time'] - total}
+    stats = pd.DataFrame(stats).T
+    stats['path'] = path
+    stats.to_csv(os.path.join(os.getcwd(), f'results/barrierstats_{n.name}.csv'))
+    return status, condition
+
+
+def add_EQ_constraints(n, o, scaling=1e-1):
+    """
+    Add equity constraints to the network.
+
+    Currently this is only implemented for the electricity sector only.
+
+    Opts must be specified in the config.yaml.
+
+    Parameters
+    ----------
+    n : pypsa.Network
+    o : str
+
+    Example
+    -------
+    scenario:
+        opts: [Co2L-EQ0.7-24h]
+
+    Require each country or node to on average produce a minimal share
+    of its total electricity consumption itself. Example: EQ0.7c demands each country
+    to produce on average at least 70% of its consumption; EQ0.7 demands
+    each node to produce on average at least 70% of its consumption.
+    """
+    # TODO: Generalize to cover myopic and other sectors?
+    float_regex = r"[0-9]*\.?[0-9]+"
+    level = float(re.findall(float_regex, o)[0])
+    if o[-1] == "c":
+        ggrouper = n.generators.bus.map(n.buses.country)
+        lgrouper = n.loads.bus.map(n.buses.country)
+        sgrouper = n.storage_units.bus.map(n.buses.country)
+    else:
+        ggrouper = n.generators.bus
+        lgrouper = n.loads.bus
+        sgrouper = n.storage_units.bus
+    load = (
+        n.snapshot_weightings.generators
+        @ n.loads_t.p_set.groupby(lgrouper, axis=1).sum()
+    )
+    inflow = (
+        n.snapshot_weightings.stores
+        @ n.storage_units_t.inflow.groupby(sgrouper, axis=1).sum()
+    )
+    inflow = inflow.reindex(load.index).fillna(0.0)
+    rhs = scaling * (level * load - inflow)
+    p = n.model["Generator-p"]
+    lhs_gen = (
+        (p * (n.snapshot_weightings.generators * scaling))
+        .groupby(ggrouper.to_xarray())
+        .sum()
+        .sum("snapshot")
+    )
+    # TODO: double check that this is really needed, why do have to subtract the spillage
+    if not n.storage_units_t.inflow.empty:
+        spillage = n.model["StorageUnit-spill"]
+        lhs_spill = (
+            (spillage * (-n.snapshot_weightings.stores * scaling))
+            .groupby(sgrouper.to_xarray())
+            .sum()
+            .sum("snapshot")
+        )
+        lhs = lhs_gen + lhs_spill
+    else:
+        lhs = lhs_gen
+    print('min eq constraint added')
+    n.model.add_constraints(lhs >= rhs, name="equity_min")
+
+
+def optimize_with_equity(n, o, equity='single', rtol=1e-5, warm_start=None, warm_start_compare=False, **kwargs):
+    """
+    Optimize the network with the minimum equity constraint o.
+
+    Parameters
+    ----------
+    n : pypsa.Network
+    o : str, e.g. 'EQ0.95c'
+    equity : str
+        'single' adds the constraint through the extra_functionality hook of n.optimize, so
+        the model is built and solved once. 'two_step' solves without the constraint, adds
+        it to the solved model and solves again. 'check' solves single pass and compares the
+        objective with the two step solve of a copy of the network.
+    rtol : float, relative objective tolerance of the check
+    warm_start, warm_start_compare : see optimize_warm, only used by the single pass solve
+    **kwargs : passed on to optimize
+    """
+    if equity == 'two_step':
+        optimize(n, **kwargs)
+        add_EQ_constraints(n, o)
+        return solve_model(n, **kwargs)
+
+    if equity == 'check':
+        n_check = n.copy()
+
+    extra_functionality = lambda n, sns: add_EQ_constraints(n, o)
+    if warm_start:
+        status, condition = optimize_warm(n, warm_start, extra_functionality, compare=warm_start_compare, **kwargs)
+    else:
+        status, condition = optimize(n, extra_functionality=extra_functionality, **kwargs)
+
+    if equity == 'check':
+        optimize_with_equity(n_check, o, 'two_step', **{k: v for k, v in kwargs.items() if k != 'basis_fn'})
+        objective, objective_check = n.model.objective.value, n_check.model.objective.value
+        deviation = abs(objective - objective_check) / max(abs(objective_check), 1.0)
+        print(f'equity check: single pass objective {objective}, two step objective {objective_check}')
+        if deviation > rtol:
+            raise ValueError(f'Single pass objective deviates from the two step objective by {deviation:.2e}')
+
+    return status, condition
+
+
+def basis_files(network_file):
+    """
+    Gurobi basis and model layout files stored next to a solved network file.
+    """
+    root = os.path.splitext(network_file)[0]
+    return root + '.bas', root + '_layout.json'
+
+
+def _blocks(items):
+    """
+    Name, first label and size of each variable or constraint block of a linopy model.
+    """
+    blocks = []
+    for name, item in items:
+        labels = np.ravel(item.labels.values)
+        valid = np.flatnonzero(labels >= 0)
+        if len(valid):
+            blocks.append([name, int(labels[valid[0]] - valid[0]), int(labels.size)])
+    return blocks
+
+
+def save_model_layout(m, fn):
+    """
+    Store the label blocks of a solved linopy model, so its basis can be translated later.
+    """
+    layout = {'variables': _blocks(m.variables.items()), 'constraints': _blocks(m.constraints.items())}
+    with open(fn, 'w') as f:
+        json.dump(layout, f)
+
+
+def _label_translation(old_blocks, new_items):
+    """
+    Map labels of an old model onto a new model for all blocks with the same name and size.
+
+    Returns a function taking an old label and returning the new one, or None if the entry
+    does not exist in the new model.
+    """
+    new = {name: item.labels.values for name, item in new_items}
+    starts, ends, targets = [], [], []
+    for name, start, size in old_blocks:
+        if name in new and new[name].size == size:
+            starts.append(start)
+            ends.append(start + size)
+            targets.append(np.ravel(new[name]))
+    order = np.argsort(starts)
+    starts, ends = np.array(starts)[order], np.array(ends)[order]
+    targets = [targets[i] for i in order]
+
+    def translate(label):
+        i = np.searchsorted(starts, label, side='right') - 1
+        if i < 0 or label >= ends[i]:
+            return None
+        new_label = targets[i][label - starts[i]]
+        return new_label if new_label >= 0 else None
+
+    return translate
+
+
+def translate_basis(basis_fn, layout_fn, m, fn):
+    """
+    Rewrite a Gurobi basis file of the base model for the model m.
+
+    Entries of variables (x<label>) and constraints (c<label>) are moved to the labels of the
+    block with the same name and size in m. Entries without a counterpart are dropped, which
+    leaves the remaining basis consistent: dropped variables are left out, dropped rows get
+    the default status. Gurobi repairs whatever is left over.
+
+    Returns
+    -------
+    number of basis entries carried over
+    """
+    with open(layout_fn) as f:
+        layout = json.load(f)
+    prefixes = {
+        'x': _label_translation(layout['variables'], m.variables.items()),
+        'c': _label_translation(layout['constraints'], m.constraints.items()),
+    }
+
+    def rename(name):
+        new_label = prefixes[name[0]](int(name[1:]))
+        return None if new_label is None else f'{name[0]}{new_label}'
+
+    entries = 0
+    with open(basis_fn) as f_in, open(fn, 'w') as f_out:
+        for line in f_in:
+            fields = line.split()
+            if not line.startswith(' ') or not fields:
+                f_out.write(line)
+                continue
+            names = [rename(name) for name in fields[1:]]
+            if all(names):
+                f_out.write(' '.join([''] + fields[:1] + names) + '\n')
+                entries += 1
+    return entries
+
+
+def solver_stats(n, runtime):
+    """
+    Wall time and iterations of the last solve of n, read from the Gurobi model kept by linopy.
+    """
+    stats = {'wall_time': runtime, 'objective': n.model.objective.value}
+    for key, attr in [('runtime', 'Runtime'), ('iterations', 'IterCount'), ('barrier_iterations', 'BarIterCount')]:
+        try:
+            stats[key] = getattr(n.model.solver_model, attr)
+        except Exception:
+            stats[key] = np.nan
+    return stats
+
+
+def optimize_warm(n, warm_start, extra_functionality=None, compare=False, **kwargs):
+    """
+    Optimize n with Gurobi starting from the optimal basis of the solved base network.
+
+    The model is built first, then the basis of the base solve is translated onto its labels
+    and passed to the solver together with dual simplex, which can start from that basis.
+    Contingencies change the base model only inside the cut window, so most of the basis
+    stays optimal and the solver only repairs the part inside the window. Without a stored
+    basis or with another solver, n is solved cold.
+
+    Wall time and iterations are written to results/solverstats_{n.name}.csv. With compare,
+    a copy of n is solved cold as well and the savings are added to the file.
+
+    Parameters
+    ----------
+    n : pypsa.Network
+    warm_start : tuple of the basis and layout file of the base network, see basis_files
+    extra_functionality : callable(n, snapshots), called after building the model
+    compare : bool
+    **kwargs : passed on to solve_model
+    """
+    basis_fn, layout_fn = warm_start
+    if kwargs.get('solver_name') != 'gurobi' or not (os.path.exists(basis_fn) and os.path.exists(layout_fn)):
+        print(f'no warm start basis {basis_fn} for solver {kwargs.get("solver_name")}, solving cold')
+        return optimize(n, extra_functionality=extra_functionality, **kwargs)
+    #the simplex warm start replaces the barrier solve
+    kwargs.pop('barrier', None)
+
+    if compare:
+        n_cold = n.copy()
+
+    start = time.perf_counter()
+    n.optimize.create_model()
+    if extra_functionality is not None:
+        extra_functionality(n, n.snapshots)
+    fd, warmstart_fn = tempfile.mkstemp(suffix='.bas')
+    os.close(fd)
+    entries = translate_basis(basis_fn, layout_fn, n.model, warmstart_fn)
+    #the cold reference keeps the stage options and resource limits, only the warm solve uses dual simplex
+    options = kwargs.pop('solver_options', {})
+    try:
+        status, condition = solve_model(n, warmstart_fn=warmstart_fn, solver_options={'Method': 1, **options}, **kwargs)
+    finally:
+        os.remove(warmstart_fn)
+    stats = {'warm': {**solver_stats(n, time.perf_counter() - start), 'basis_entries': entries}}
+
+    if compare:
+        start = time.perf_counter()
+        optimize(n_cold, extra_functionality=extra_functionality, solver_options=options, **kwargs)
+        stats['cold'] = solver_stats(n_cold, time.perf_counter() - start)
+        stats['saving'] = {key: stats['cold'][key] - stats['warm'][key] for key in ['wall_time', 'runtime', 'iterations', 'barrier_iterations']}
+
+    pd.DataFrame(stats).T.to_csv(os.path.join(os.getcwd(), f'results/solverstats_{n.name}.csv'))
+    return status, condition
+
+
+def _like(template, df):
+    """
+    DataArray with the coordinates of a snapshot x component constraint array, filled from df.
+    """
+    from xarray import DataArray
+
+    other = [dim for dim in template.dims if dim != 'snapshot'][0]
+    values = df.reindex(index=template.indexes['snapshot'], columns=template.indexes[other])
+    coords = {'snapshot': template.indexes['snapshot'], other: template.indexes[other]}
+    return DataArray(values.to_numpy(dtype=float), coords=coords, dims=('snapshot', other)).transpose(*template.dims)
+
+
+def update_operational_limits(n, c, attr):
+    """
+    Write the current per unit limits of a component into the already built model of n.
+
+    Only the operational limit constraints change, so the model keeps its structure and a
+    solver can restart from the previous basis. The rhs of non-extendable assets
+    (e.g. p_max_pu * p_nom) and the capacity coefficients of extendable assets
+    (dispatch - p_max_pu * p_nom <= 0) are rebuilt as pypsa builds them.
+
+    Parameters
+    ----------
+    n : pypsa.Network with a built model
+    c : str, component, e.g. 'Generator', 'Line' or 'Link'
+    attr : str, dispatch variable, e.g. 'p' or 's'
+    """
+    from pypsa.descriptors import get_bounds_pu, nominal_attrs
+    from pypsa.optimization.common import reindex
+
+    m = n.model
+    sns = m[f'{c}-{attr}'].indexes['snapshot']
+    nominal = nominal_attrs[c]
+
+    fix_i = n.get_non_extendable_i(c).difference(n.get_committable_i(c))
+    if f'{c}-fix-{attr}-upper' in m.constraints and not fix_i.empty:
+        min_pu, max_pu = get_bounds_pu(n, c, sns, fix_i, attr)
+        capacity = n.df(c)[nominal].reindex(fix_i)
+        for bound, pu in [('lower', min_pu), ('upper', max_pu)]:
+            con = m.constraints[f'{c}-fix-{attr}-{bound}']
+            con.rhs = _like(con.rhs, pu.mul(capacity))
+
+    ext_i = n.get_extendable_i(c)
+    if f'{c}-ext-{attr}-upper' in m.constraints and not ext_i.empty:
+        min_pu, max_pu = get_bounds_pu(n, c, sns, ext_i, attr)
+        dispatch = reindex(m[f'{c}-{attr}'], c, ext_i)
+        capacity = m[f'{c}-{nominal}']
+        for bound, pu in [('lower', min_pu), ('upper', max_pu)]:
+            con = m.constraints[f'{c}-ext-{attr}-{bound}']
+            con.lhs = dispatch - capacity * _like(con.rhs, pu)
+
+
+solution_components = ['Generator', 'StorageUnit', 'Store', 'Load', 'Line', 'Link', 'Transformer', 'Bus']
+
+
+def _input_series(n, c):
+    """
+    Names of the non-empty time series of a component that are inputs of the model.
+    """
+    attrs = n.components[c]['attrs']
+    inputs = attrs.index[attrs.status.str.startswith('Input')]
+    return [attr for attr, df in n.pnl(c).items() if attr in inputs and not df.empty]
+
+
+def _output_series(n, c):
+    """
+    Names of the time series of a component that hold results rather than inputs.
+    """
+    attrs = n.components[c]['attrs']
+    inputs = attrs.index[attrs.status.str.startswith('Input')]
+    return [attr for attr, df in n.pnl(c).items() if attr not in inputs and not df.empty]
+
+
+def solution_series(n):
+    """
+    Result time series of n as {component: {attr: pd.DataFrame}}.
+    """
+    return {c: {attr: n.pnl(c)[attr] for attr in _output_series(n, c)} for c in solution_components}
+
+
+def splice_solution(n, base, part, snapshots):
+    """
+    Write the result time series of a solve over a subset of snapshots into n.
+
+    Parameters
+    ----------
+    n : pypsa.Network receiving the results for all its snapshots
+    base : results of n outside of snapshots, as returned by solution_series, or None
+    part : results for snapshots, as returned by solution_series
+    snapshots : snapshots covered by part
+    """
+    for c in solution_components:
+        base_c = (base or {}).get(c, {})
+        part_c = part.get(c, {})
+        for attr in set(base_c) | set(part_c):
+            df = base_c.get(attr, n.pnl(c).get(attr, pd.DataFrame()))
+            win = part_c.get(attr, pd.DataFrame(index=snapshots))
+            df = df.reindex(index=n.snapshots, columns=df.columns.union(win.columns))
+            df.loc[snapshots, win.columns] = win.values
+            n.pnl(c)[attr] = df
+    #capacities are fixed in all partial solves
+    for c in n.iterate_components(['Generator', 'StorageUnit', 'Store', 'Line', 'Link', 'Transformer']):
+        nominal = c.name in ['Line', 'Transformer'] and 's_nom' or c.name == 'Store' and 'e_nom' or 'p_nom'
+        c.df[f'{nominal}_opt'] = c.df[nominal]
+
+
+#dispatch series priced by marginal_cost in pypsa's objective
+cost_series = {'Generator': 'p', 'StorageUnit': 'p_dispatch', 'Store': 'p', 'Link': 'p0'}
+
+
+def operational_cost(n, snapshots):
+    """
+    Marginal cost of the dispatch of the solved network n over snapshots, weighted like the
+    marginal cost terms of pypsa's objective.
+    """
+    from pypsa.descriptors import get_switchable_as_dense as get_as_dense
+
+    weighting = n.snapshot_weightings.objective.loc[snapshots]
+    cost = 0.
+    for c, attr in cost_series.items():
+        dispatch = n.pnl(c)[attr]
+        if n.df(c).empty or dispatch.empty:
+            continue
+        marginal_cost = get_as_dense(n, c, 'marginal_cost', snapshots)[dispatch.columns]
+        cost += dispatch.loc[snapshots].mul(marginal_cost).mul(weighting, axis=0).sum().sum()
+    return cost
+
+
+def optimize_window(n, n_base, cut_start, cut_end, buffer_days=14, accuracy_report=False, **kwargs):
+    """
+    Re-optimize the dispatch of n only inside the cut window plus a buffer on each side.
+
+    Meant for models whose capacities are fixed to those of the base network (noinv). A
+    copy of n restricted to the window snapshots is solved with the storage levels fixed
+    to the base solution at both edges: the initial level is the base level just before
+    the window and the level in the last window snapshot is set to the base level. The
+    result is spliced into the full year base solution, so all result time series of n
+    have the same shape as after a full year solve. n.objective is the objective of the
+    window solve plus the operational cost of the base dispatch outside the window, the
+    objective of a full year solve of n with that dispatch. Shadow prices are only known
+    inside the window and are NaN outside of it, so the storage values taken from n by
+    mod_rh_storage are the means over the window.
+
+    With accuracy_report, a copy of n is also solved over the full year and the differences
+    are written to results/windowcheck_{n.name}.csv.
+
+    Parameters
+    ----------
+    n : pypsa.Network with capacities fixed to the base solution
+    n_base : solved base pypsa.Network
+    cut_start, cut_end : pd.Timestamp
+    buffer_days : float, snapshots added before and after the cut window
+    accuracy_report : bool
+    **kwargs : passed on to n.optimize
+    """
+    if accuracy_report:
+        n_full = n.copy()
+
+    start = time.perf_counter()
+    sns = n.snapshots
+    buffer = pd.Timedelta(days=buffer_days)
+    window = sns[(sns >= cut_start - buffer) & (sns <= cut_end + buffer)]
+    first = sns.get_loc(window[0])
+
+    n_win = n.copy(snapshots=window)
+
+    #storage levels at the window edges from the base solution
+    su = n_win.storage_units
+    if not su.empty:
+        soc = n_base.storage_units_t.state_of_charge.reindex(columns=su.index)
+        if first:
+            su['state_of_charge_initial'] = soc.loc[sns[first - 1]]
+        else:
+            su['state_of_charge_initial'] = soc.iloc[-1].where(su.cyclic_state_of_charge, su.state_of_charge_initial)
+        su['cyclic_state_of_charge'] = False
+        su['cyclic_state_of_charge_per_period'] = False
+        #keep the levels set in n, the base solution meets them at the last snapshot as well
+        soc_set = n_win.storage_units_t.state_of_charge_set.reindex(index=window, columns=su.index)
+        soc_set.iloc[-1] = soc.loc[window[-1]]
+        n_win.storage_units_t.state_of_charge_set = soc_set
+
+    st = n_win.stores
+    if not st.empty:
+        e = n_base.stores_t.e.reindex(columns=st.index)
+        if first:
+            st['e_initial'] = e.loc[sns[first - 1]]
+        else:
+            st['e_initial'] = e.iloc[-1].where(st.e_cyclic, st.e_initial)
+        st['e_cyclic'] = False
+        st['e_cyclic_per_period'] = False
+        fixed = st.index[st.e_nom > 0]
+        for attr in ['e_min_pu', 'e_max_pu']:
+            pu = n_win.stores_t[attr].reindex(columns=st.index).fillna(st[attr]).reindex(index=window)
+            pu.loc[window[-1], fixed] = e.loc[window[-1], fixed] / st.e_nom[fixed]
+            n_win.stores_t[attr] = pu
+
+    status, condition = optimize(n_win, **kwargs)
+
+    #splice the window solution into the base dispatch, the shadow prices of the base solve
+    #are not those of n and are dropped
+    base = solution_series(n_base)
+    for c, series in base.items():
+        for attr in [attr for attr in series if attr == 'marginal_price' or attr.startswith('mu_')]:
+            del series[attr]
+            n.pnl(c)[attr] = pd.DataFrame(index=sns)
+    splice_solution(n, base, solution_series(n_win), window)
+    n.objective = n_win.objective + operational_cost(n, sns.difference(window))
+    runtime = time.perf_counter() - start
+
+    if accuracy_report:
+        start = time.perf_counter()
+        optimize(n_full, **kwargs)
+        report = window_accuracy(n, n_full)
+        report.loc['wall_time'] = [runtime, time.perf_counter() - start, np.nan, np.nan]
+        report.to_csv(os.path.join(os.getcwd(), f'results/windowcheck_{n.name}.csv'))
+
+    return status, condition
+
+
+def window_accuracy(n, n_full):
+    """
+    Compare a window re-optimized network with the full year solve of the same network.
+
+    Returns
+    -------
+    pd.DataFrame with the total of each quantity and the objective in both networks, the
+    absolute deviation of the totals and the largest deviation of a single value
+    """
+    w = n.snapshot_weightings.generators
+    shedding = n.generators.index[n.generators.index.str.endswith('load')]
+    quantities = {
+        'generation': lambda m: m.generators_t.p,
+        'load_shedding': lambda m: m.generators_t.p[shedding],
+        'storage_dispatch': lambda m: m.storage_units_t.p,
+        'state_of_charge': lambda m: m.storage_units_t.state_of_charge,
+        'operational_cost': lambda m: m.generators_t.p.mul(m.generators.marginal_cost),
+    }
+    report = pd.DataFrame(index=list(quantities), columns=['window', 'full', 'deviation', 'max_deviation'], dtype=float)
+    for key, get in quantities.items():
+        window, full = get(n), get(n_full)
+        report.loc[key, 'window'] = window.mul(w, axis=0).sum().sum()
+        report.loc[key, 'full'] = full.mul(w, axis=0).sum().sum()
+        report.loc[key, 'max_deviation'] = (window - full).abs().max().max()
+    report.loc['objective', ['window', 'full']] = [n.objective, n_full.objective]
+    report['deviation'] = (report.window - report.full).abs()
+    return report
+
+
+def optimize_rolling_horizon(n, n_pf, horizon, mode='sequential', processes=None, **kwargs):
+    """
+    Solve the rolling horizon model n in windows of horizon snapshots.
+
+    sequential: as pypsa's optimize_with_rolling_horizon, the storage levels are carried
+    from one window to the next, see optimize_rolling_horizon_sequential.
+
+    persistent: same result as sequential, but the window model is built only once and
+    every further window only updates its time dependent limits and initial storage
+    levels, see optimize_rolling_horizon_persistent.
+
+    parallel: the windows are decoupled and solved in a process pool. Each window starts
+    from the storage levels of the perfect foresight solution n_pf at the snapshot before
+    it (the first window from state_of_charge_initial of n). Its end level is free and
+    valued at the MSV set as marginal cost by mod_rh_storage, see add_storage_value, while
+    the dispatch of the storage units keeps the marginal cost of n_pf, so the MSV is not
+    counted twice. The window results are stitched into n, so n has the same time series
+    as after the sequential solve, and n.objective is the sum of the window objectives
+    without the storage value.
+
+    Parameters
+    ----------
+    n : rolling horizon pypsa.Network, prepared with mod_rh_storage and no_inv
+    n_pf : solved perfect foresight pypsa.Network
+    horizon : int, snapshots per window
+    mode : 'sequential', 'persistent' or 'parallel'
+    processes : int, size of the process pool, by default the number of cpus
+    **kwargs : passed on to n.optimize
+    """
+    horizon = int(horizon)
+    if mode == 'sequential':
+        return optimize_rolling_horizon_sequential(n, horizon, **kwargs)
+    if mode == 'persistent':
+        return optimize_rolling_horizon_persistent(n, horizon, **kwargs)
+    if mode != 'parallel':
+        raise ValueError(f"rolling horizon mode must be 'sequential', 'persistent' or 'parallel', got {mode!r}")
+
+    #gurobi environments can not be sent to other processes, each worker opens its own
+    kwargs.pop('env', None)
+    #share the threads of the job between the workers
+    solver_options = dict(kwargs.pop('solver_options', {}))
+    threads = resource_options.get(kwargs.get('solver_name'), (None, None))[0]
+    if threads in solver_options:
+        processes = processes or solver_options[threads]
+        solver_options[threads] = max(1, solver_options[threads] // processes)
+    kwargs['solver_options'] = solver_options
+    sns = n.snapshots
+    soc = n_pf.storage_units_t.state_of_charge.reindex(columns=n.storage_units.index)
+    e = n_pf.stores_t.e.reindex(columns=n.stores.index)
+    msv = n.storage_units.marginal_cost
+    marginal_cost = n_pf.storage_units.marginal_cost.reindex(n.storage_units.index).fillna(msv)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        windows = []
+        for i in range(0, len(sns), horizon):
+            n_win = n.copy(snapshots=sns[i:i + horizon])
+            if i:
+                n_win.storage_units['state_of_charge_initial'] = soc.loc[sns[i - 1]]
+                n_win.stores['e_initial'] = e.loc[sns[i - 1]]
+            n_win.stores['e_cyclic'] = False
+            n_win.storage_units['marginal_cost'] = marginal_cost
+            fn = os.path.join(tmpdir, f'window{i}.nc')
+            n_win.export_to_netcdf(fn)
+            windows.append((fn, n_win.snapshots))
+
+        with ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_solve_rolling_window, [fn for fn, _ in windows], [kwargs] * len(windows), [msv] * len(windows)))
+
+    for (_, window), (status, condition, objective, part) in zip(windows, results):
+        if status != 'ok':
+            raise RuntimeError(f'rolling horizon window starting {window[0]} failed with {status}, {condition}')
+        splice_solution(n, None, part, window)
+    n.objective = sum(objective for _, _, objective, _ in results)
+    return status, condition
+
+
+def optimize_rolling_horizon_sequential(n, horizon, **kwargs):
+    """
+    Solve n in consecutive windows of horizon snapshots like pypsa's
+    optimize_with_rolling_horizon (without overlap), through optimize so that each window
+    keeps only the requested duals. The storage levels are carried from one window to the next.
+    """
+    sns = n.snapshots
+    for i in range(0, len(sns), horizon):
+        if i:
+            if not n.stores.empty:
+                n.stores.e_initial = n.stores_t.e.loc[sns[i - 1]]
+            if not n.storage_units.empty:
+                n.storage_units.state_of_charge_initial = n.storage_units_t.state_of_charge.loc[sns[i - 1]]
+        status, condition = optimize(n, sns[i:i + horizon], **kwargs)
+        if status != 'ok':
+            print(f'rolling horizon window starting {sns[i]} ended with {status}, {condition}')
+    return status, condition
+
+
+def add_storage_value(n, sns, value):
+    """
+    Value the state of charge of the storage units at the last of sns with value (€/MWh,
+    e.g. the MSV) as a negative cost in the objective of the built model of n.
+    """
+    from xarray import DataArray
+
+    m = n.model
+    soc = m['StorageUnit-state_of_charge'].sel(snapshot=sns[-1])
+    value = value.reindex(soc.indexes['StorageUnit']).fillna(0)
+    value = DataArray(value.to_numpy(dtype=float), coords={'StorageUnit': value.index}, dims='StorageUnit')
+    m.add_objective(m.objective.expression - (soc * value).sum(), overwrite=True)
+
+
+def _solve_rolling_window(fn, kwargs, storage_value=None):
+    """
+    Solve one rolling horizon window in a worker process of optimize_rolling_horizon, with
+    its end storage levels valued at storage_value. The objective is returned without
+    that value.
+    """
+    import pypsa
+    n = pypsa.Network(fn)
+    if storage_value is None or n.storage_units.empty:
+        status, condition = optimize(n, **kwargs)
+        return status, condition, n.objective, solution_series(n)
+
+    extra_functionality = lambda n, sns: add_storage_value(n, sns, storage_value)
+    status, condition = optimize(n, extra_functionality=extra_functionality, **kwargs)
+    objective = n.objective
+    if status == 'ok':
+        objective += n.storage_units_t.state_of_charge.iloc[-1].mul(storage_value).sum()
+    return status, condition, objective, solution_series(n)
+
+
+#time series moved into the persistent rolling horizon model and the limits built from them
+rolling_series = {
+    'Generator': ['p_max_pu', 'p_min_pu'],
+    'StorageUnit': ['p_max_pu', 'p_min_pu', 'inflow'],
+    'Store': ['e_max_pu', 'e_min_pu'],
+    'Line': ['s_max_pu'],
+    'Link': ['p_max_pu', 'p_min_pu'],
+    'Load': ['p_set'],
+}
+rolling_limits = [('Generator', 'p'), ('StorageUnit', 'p_dispatch'), ('StorageUnit', 'p_store'),
+                  ('Store', 'e'), ('Line', 's'), ('Link', 'p')]
+
+
+def _balance_rhs(n):
+    """
+    Right hand sides of the nodal and storage balances of the model of n, as pypsa builds them.
+    """
+    from pypsa.descriptors import get_switchable_as_dense as get_as_dense
+
+    m = n.model
+    sns = n.snapshots
+    rhs = {}
+
+    loads = (-get_as_dense(n, 'Load', 'p_set', sns) * n.loads.sign).T.groupby(n.loads.bus).sum().T
+    rhs['Bus-nodal_balance'] = loads.reindex(columns=n.buses.index, fill_value=0)
+
+    storage = [('StorageUnit', 'state_of_charge_initial', 'cyclic_state_of_charge'), ('Store', 'e_initial', 'e_cyclic')]
+    for c, initial, cyclic in storage:
+        if f'{c}-energy_balance' not in m.constraints:
+            continue
+        df = n.df(c)
+        eh = pd.DataFrame({i: n.snapshot_weightings.stores[sns] for i in df.index}, index=sns)
+        inflow = get_as_dense(n, c, 'inflow', sns) if c == 'StorageUnit' else pd.DataFrame(0., index=sns, columns=df.index)
+        eff_stand = (1 - get_as_dense(n, c, 'standing_loss', sns)).pow(eh)
+        balance = -inflow.mul(eh)
+        balance.iloc[0] -= (df[initial] * eff_stand.iloc[0]).where(~df[cyclic], 0)
+        rhs[f'{c}-energy_balance'] = balance
+    return rhs
+
+
+def _update_balance_rhs(n, check=False):
+    """
+    Write the balance right hand sides of n into its model, or with check only test that
+    they reproduce the ones pypsa built.
+    """
+    m = n.model
+    for name, df in _balance_rhs(n).items():
+        con = m.constraints[name]
+        rhs = _like(con.rhs, df)
+        if check:
+            old = con.rhs.values
+            valid = np.isfinite(old)
+            if not np.allclose(rhs.values[valid], old[valid]):
+                return False
+        else:
+            con.rhs = rhs
+    return True
+
+
+def optimize_rolling_horizon_persistent(n, horizon, **kwargs):
+    """
+    Solve n with rolling horizon like pypsa's optimize_with_rolling_horizon, building the
+    window model only once.
+
+    The model of the first window is built on a copy of n restricted to its snapshots. For
+    each further window the time series of that window are written into the copy by
+    position, and only the operational limits (availability, line and link limits), the
+    nodal balance (loads) and the storage balance (inflow and initial storage level) of
+    the model are updated. Each window is solved from the basis of the previous one. A
+    shorter last window gets its own model. The results are stitched into n.
+
+    Networks whose window models do not share their coefficients, i.e. with varying
+    snapshot weightings or with time dependent inputs outside of rolling_series (e.g.
+    marginal costs, state_of_charge_set), are solved with
+    optimize_rolling_horizon_sequential instead.
+
+    Parameters
+    ----------
+    n : pypsa.Network, capacities fixed
+    horizon : int, snapshots per window
+    **kwargs : passed on to solve_model
+    """
+    sns = n.snapshots
+    horizon = int(horizon)
+    uncovered = [f'{c}-{attr}' for c in n.all_components for attr in _input_series(n, c)
+                 if attr not in rolling_series.get(c, [])]
+    if n.snapshot_weightings.nunique().max() > 1 or uncovered:
+        print(f'rolling horizon windows differ in more than the updated limits ({", ".join(uncovered) or "snapshot weightings"}), '
+              'solving them one by one')
+        return optimize_rolling_horizon_sequential(n, horizon, **kwargs)
+
+    warm = kwargs.get('solver_name') == 'gurobi'
+    models = {}
+    bases = {}
+    objective = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for i in range(0, len(sns), horizon):
+            window = sns[i:i + horizon]
+            n_win = models.get(len(window))
+            if n_win is None:
+                n_win = n.copy(snapshots=window)
+            else:
+                for c, attrs in rolling_series.items():
+                    for attr in attrs:
+                        if not n.pnl(c)[attr].empty:
+                            n_win.pnl(c)[attr] = n.pnl(c)[attr].iloc[i:i + len(window)].set_axis(n_win.snapshots)
+            if i:
+                n_win.storage_units['state_of_charge_initial'] = n.storage_units_t.state_of_charge.loc[sns[i - 1]]
+                n_win.stores['e_initial'] = n.stores_t.e.loc[sns[i - 1]]
+
+            if len(window) not in models:
+                n_win.optimize.create_model()
+                if not _update_balance_rhs(n_win, check=True):
+                    print('storage or nodal balance of pypsa not reproduced, solving rolling horizon windows one by one')
+                    return optimize_rolling_horizon_sequential(n, horizon, **kwargs)
+                models[len(window)] = n_win
+            else:
+                for c, attr in rolling_limits:
+                    if f'{c}-{attr}' in n_win.model.variables:
+                        update_operational_limits(n_win, c, attr)
+                _update_balance_rhs(n_win)
+
+            basis_fn = os.path.join(tmpdir, f'{len(window)}_{i}.bas')
+            options = dict(basis_fn=basis_fn, warmstart_fn=bases.get(len(window))) if warm else {}
+            status, condition = solve_model(n_win, **options, **kwargs)
+            if status != 'ok':
+                print(f'rolling horizon window starting {window[0]} ended with {status}, {condition}')
+            if warm and os.path.exists(basis_fn):
+                bases[len(window)] = basis_fn
+            objective += n_win.objective
+            splice_solution(n, None, solution_series(n_win), window)
+
+    n.objective = objective
+    return status, condition
+
+
+def _differs(a, b):
+    """
+    Elementwise a != b, with NaN equal to NaN.
+    """
+    return (a != b) & ~(pd.isna(a) & pd.isna(b))
+
+
+def _netcdf_values(values):
+    """
+    Values of a frame or series in a dtype netcdf can store.
+    """
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype == object else values
+
+
+def export_delta(n, n_base, base_file, fn, complevel=0, shuffle=True):
+    """
+    Export n as its differences to the network stored in base_file.
+
+    Stored are the static attributes that differ from n_base (e.g. capacities fixed by
+    no_inv), the rows and columns of the time series that differ (the cut window of
+    p_max_pu, inflow, s_max_pu, ..., and the results that differ from the base solution,
+    only the window of a window solve), the result series n does not have and the removed
+    global constraints. load_delta rebuilds the full network from base_file and this file.
+    base_file is kept relative to the directory of fn, so the two files can be moved together.
+
+    Parameters
+    ----------
+    n : solved pypsa.Network
+    n_base : pypsa.Network as stored in base_file
+    base_file : path of the base network, kept in the file as link relative to fn
+    fn : path of the delta file (netcdf)
+    complevel, shuffle : compression, see netcdf_compression
+    """
+    import xarray as xr
+    from pypsa.descriptors import get_switchable_as_dense
+
+    data = {}
+    cleared = []
+    #sub networks are derived from the topology and not stored, as in export_to_netcdf
+    for c in n.iterate_components(n.all_components - {'SubNetwork'}):
+        base = n_base.df(c.name)
+        outputs = c.attrs.index[c.attrs.status == 'Output']
+
+        for attr in c.df.columns:
+            if attr not in base.columns:
+                changed = c.df.index
+            else:
+                changed = c.df.index[_differs(c.df[attr], base[attr].reindex(c.df.index))]
+            if len(changed):
+                name = f'{c.list_name}-static-{attr}'
+                data[name] = xr.DataArray(_netcdf_values(c.df.loc[changed, attr]), coords={f'{name}-i': changed.rename(f'{name}-i')},
+                                          dims=f'{name}-i')
+
+        for attr, df in c.pnl.items():
+            if df.empty:
+                #results of the base solution that n does not have, e.g. duals not kept
+                if not n_base.pnl(c.name)[attr].empty:
+                    cleared.append(f'{c.list_name}-t-{attr}')
+                continue
+            if attr in base.columns and attr not in outputs:
+                dense = get_switchable_as_dense(n_base, c.name, attr)
+            else:
+                dense = n_base.pnl(c.name)[attr]
+            mask = _differs(df, dense.reindex(index=df.index, columns=df.columns))
+            rows, cols = df.index[mask.any(axis=1)], df.columns[mask.any(axis=0)]
+            if len(rows) and len(cols):
+                name = f'{c.list_name}-t-{attr}'
+                dims = (f'{name}-snapshots', f'{name}-i')
+                data[name] = xr.DataArray(df.loc[rows, cols].to_numpy(), coords={dim: index.rename(dim) for dim, index in zip(dims, [rows, cols])},
+                                          dims=dims)
+
+    removed = n_base.global_constraints.index.difference(n.global_constraints.index)
+    #networks spliced from partial solves may carry no objective
+    attrs = {'base_file': os.path.relpath(os.path.abspath(base_file), os.path.dirname(os.path.abspath(fn))), 'name': n.name, 'objective': float(getattr(n, 'objective', np.nan)),
+             'removed_global_constraints': ','.join(removed), 'cleared_series': ','.join(cleared)}
+    ds = xr.Dataset(data, attrs=attrs)
+    compression = netcdf_compression(complevel, shuffle)
+    ds.to_netcdf(fn, encoding={var: compression for var in ds.data_vars if ds[var].dtype.kind in 'biuf'} if compression else None)
+
+
+def load_delta(fn):
+    """
+    Rebuild the full pypsa.Network of a file written by export_delta.
+    """
+    import xarray as xr
+    import pypsa
+    from pypsa.descriptors import get_switchable_as_dense
+
+    with xr.open_dataset(fn) as ds:
+        ds.load()
+    #the base file is relative to the delta file, files of older exports hold an absolute path
+    n = pypsa.Network(os.path.join(os.path.dirname(os.path.abspath(fn)), ds.attrs['base_file']))
+    n.name = ds.attrs['name']
+    #the objective of the base file does not apply to n
+    if np.isfinite(ds.attrs['objective']):
+        n.objective = ds.attrs['objective']
+    elif hasattr(n, 'objective'):
+        del n.objective
+    removed = [gc for gc in ds.attrs['removed_global_constraints'].split(',') if gc in n.global_constraints.index]
+    n.global_constraints = n.global_constraints.drop(removed)
+
+    list_names = {c.list_name: c.name for c in n.iterate_components(n.all_components, skip_empty=False)}
+    for name in filter(None, ds.attrs.get('cleared_series', '').split(',')):
+        list_name, _, attr = name.split('-', 2)
+        n.pnl(list_names[list_name])[attr] = pd.DataFrame(index=n.snapshots)
+    series = []
+    for name, values in ds.data_vars.items():
+        list_name, kind, attr = name.split('-', 2)
+        c = list_names[list_name]
+        if kind == 'static':
+            index = values.indexes[f'{name}-i']
+            df = n.df(c)
+            df.loc[index, attr] = values.to_numpy().astype(df[attr].dtype) if attr in df.columns else values.to_numpy()
+        else:
+            series.append((c, attr, values))
+
+    #time series after the static attributes, columns new in n are filled from them
+    for c, attr, values in series:
+        name = values.name
+        rows, cols = values.indexes[f'{name}-snapshots'], values.indexes[f'{name}-i']
+        df = n.pnl(c)[attr]
+        new = cols.difference(df.columns)
+        if len(new):
+            if attr in n.df(c).columns:
+                df = pd.concat([df, get_switchable_as_dense(n, c, attr)[new]], axis=1)
+            else:
+                df = df.reindex(columns=df.columns.append(new))
+        df = df.reindex(index=n.snapshots)
+        df.loc[rows, cols] = values.to_numpy()
+        n.pnl(c)[attr] = df
+    return n
+
+
+def netcdf_compression(complevel=0, shuffle=True):
+    """
+    Compression argument of export_to_netcdf for zlib at complevel, None for complevel 0.
+    """
+    return {'zlib': True, 'complevel': complevel, 'shuffle': shuffle} if complevel else None
+
+
+def export_netcdf(n, fn, content='full', complevel=0, shuffle=True, float32=False):
+    """
+    Write n with export_to_netcdf.
+
+    Parameters
+    ----------
+    n : pypsa.Network
+    fn : path of the netcdf file
+    content : 'full', or 'solution' to leave out the input time series. A network read from
+        a solution file has the static inputs and all results, its time dependent inputs fall
+        back to their static values.
+    complevel, shuffle : compression, see netcdf_compression
+    float32 : bool, store all numbers as float32
+    """
+    compression = netcdf_compression(complevel, shuffle)
+    if content == 'full':
+        n.export_to_netcdf(fn, compression=compression, float32=float32)
+        return
+    if content != 'solution':
+        raise ValueError(f"export content must be 'full' or 'solution', got {content!r}")
+    #the dataset export_to_netcdf returns without a path carries the compression encoding
+    ds = n.export_to_netcdf(compression=compression, float32=float32)
+    inputs = [f'{c.list_name}_t_{attr}' for c in n.iterate_components()
+              for attr in c.pnl if c.attrs.status.get(attr, 'Output') != 'Output']
+    inputs = [var for var in inputs if var in ds]
+    ds.drop_vars(inputs + [f'{var}_i' for var in inputs if f'{var}_i' in ds.coords]).to_netcdf(fn)
+
+
+def export_network(n, fn, n_base=None, base_file=None, lossless=False):
+    """
+    Export n to fn with the profile set in the export section of the solving config.
+
+    mode full writes the network with export_to_netcdf, with content full or solution only,
+    zlib compression at complevel (0: none) with shuffle, and optionally as float32, see
+    export_netcdf. mode delta writes only its differences to the base network, see
+    export_delta. Networks read by later stages (lossless, e.g. the solved base network and the
+    perfect foresight networks the rolling horizon starts from) are kept at float64,
+    only mode delta and compression apply to them. The file is
+    written under a temporary name and renamed. With record, the save and load time and
+    the file size go to results/exportstats_{n.name}.csv.
+    """
+    options = solving_options()['export']
+    start = time.perf_counter()
+    #write next to the target and rename, an interrupted job never leaves a partial output
+    root, ext = os.path.splitext(fn)
+    tmp = f'{root}.tmp{ext}'
+    if options['mode'] == 'delta' and n_base is not None:
+        export_delta(n, n_base, base_file, tmp, options['complevel'], options['shuffle'])
+    elif lossless:
+        export_netcdf(n, tmp, complevel=options['complevel'], shuffle=options['shuffle'])
+    else:
+        export_netcdf(n, tmp, options['content'], options['complevel'], options['shuffle'], options['float32'])
+    os.replace(tmp, fn)
+    save_time = time.perf_counter() - start
+
+    if options['record']:
+        stats = export_stats(fn, save_time)
+        stats = pd.DataFrame([{**options, **stats}], index=[n.name])
+        stats.to_csv(os.path.join(os.getcwd(), f'results/exportstats_{n.name}.csv'))
+
+
+def export_stats(fn, save_time):
+    """
+    Save time, load time and size of an exported network file.
+    """
+    start = time.perf_counter()
+    load_network(fn)
+    return {'save_s': save_time, 'load_s': time.perf_counter() - start, 'size_mb': os.path.getsize(fn) / 1e6}
+
+
+def load_network(fn):
+    """
+    Load a network written by export_network in either mode.
+    """
+    import xarray as xr
+    import pypsa
+
+    with xr.open_dataset(fn) as ds:
+        delta = 'base_file' in ds.attrs
+    return load_delta(fn) if delta else pypsa.Network(fn)
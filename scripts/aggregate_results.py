@@ -0,0 +1,162 @@
+import os
+import glob
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from _helpers import read_results, scenario_keys
+
+kpi_tables = ['system_cost', 'capacity_delta', 'load_shedding']
+
+def table_file(results, table, name):
+    """
+    File holding a results table of one scenario, the csv if present, else the parquet store file.
+    """
+    fn = os.path.join(results, f'{table}_{name}.csv')
+    if os.path.exists(fn):
+        return fn
+    keys = scenario_keys(name)
+    return os.path.join(results, 'store', table, f"country={keys['country']}", f"contingency={keys['contingency']}",
+                        f"model={keys['model']}", f'{name}.parquet')
+
+def read_table(results, table, name):
+    """
+    Results table of one scenario in the layout of the csv files written by export_statistics.
+    """
+    fn = table_file(results, table, name)
+    if fn.endswith('.csv'):
+        index_col = [0, 1] if table == 'gen' else 0
+        df = pd.read_csv(fn, index_col=index_col)
+        if table == 'gen':
+            df.columns = pd.to_datetime(df.columns)
+        return df
+    df = read_results(table, root=os.path.join(results, 'store'), scenario=name)
+    index = ['carrier', 'bus_country'] if table == 'gen' else 'carrier'
+    columns = 'snapshot' if table == 'gen' else 'bus_country'
+    return df.pivot_table(index=index, columns=columns, values='value', aggfunc='sum')
+
+def base_name(name):
+    """
+    Name of the solved base network a scenario is compared with, at the resolution of the scenario.
+    """
+    keys = scenario_keys(name)
+    base = f"{keys['country']}_{keys['tl']}_base_roll_solved" if keys['roll'] else f"{keys['country']}_{keys['tl']}_base_solved"
+    return f"{base}_{keys['resolution']}" if keys['resolution'] else base
+
+def scenario_files(results, name):
+    """
+    Files the KPIs of a scenario are computed from.
+    """
+    files = [table_file(results, table, name) for table in ['syscost', 'cap', 'gen']]
+    if scenario_keys(name)['contingency'] != 'base':
+        files.append(table_file(results, 'cap', base_name(name)))
+    return files
+
+def stamp(files, use_hash=False):
+    """
+    Cache key of a list of files: modification time and size, or with use_hash the sha1 of the contents.
+    """
+    key = []
+    for fn in files:
+        if not os.path.exists(fn):
+            key.append([fn, None])
+        elif use_hash:
+            with open(fn, 'rb') as f:
+                key.append([fn, hashlib.sha1(f.read()).hexdigest()])
+        else:
+            info = os.stat(fn)
+            key.append([fn, info.st_mtime_ns, info.st_size])
+    return key
+
+def scenario_kpis(results, name):
+    """
+    KPIs of one scenario for the study country: system cost in Bill€, capacity deltas
+    against the base network in GW by carrier and load shedding in GWh.
+    """
+    country = scenario_keys(name)['country']
+
+    syscost = read_table(results, 'syscost', name)
+    system_cost = {'domestic': syscost.get(country, pd.Series(dtype=float)).sum(), 'total': syscost.sum().sum()}
+
+    if scenario_keys(name)['contingency'] == 'base':
+        capacity_delta = {}
+    else:
+        cap = read_table(results, 'cap', name).get(country, pd.Series(dtype=float))
+        cap_base = read_table(results, 'cap', base_name(name)).get(country, pd.Series(dtype=float))
+        capacity_delta = cap.sub(cap_base, fill_value=0).to_dict()
+
+    gen = read_table(results, 'gen', name)
+    hours = gen.columns.to_series().diff().bfill().dt.total_seconds().fillna(3600) / 3600
+    shedding = gen[gen.index.get_level_values(0) == 'load'].mul(hours).sum(axis=1).groupby(level=1).sum()
+    load_shedding = {'domestic': shedding.get(country, 0.), 'total': shedding.sum()}
+
+    return {'system_cost': system_cost, 'capacity_delta': capacity_delta, 'load_shedding': load_shedding}
+
+def _scenario_kpis(args):
+    return scenario_kpis(*args)
+
+def find_scenarios(results):
+    """
+    Names of all scenarios with a system cost table in the results directory.
+    """
+    names = {os.path.basename(fn)[len('syscost_'):-len('.csv')] for fn in glob.glob(os.path.join(results, 'syscost_*.csv'))}
+    names |= {os.path.basename(fn)[:-len('.parquet')] for fn in glob.glob(os.path.join(results, 'store', 'syscost', '*', '*', '*', '*.parquet'))}
+    return sorted(names)
+
+def aggregate(results='results', output='results/aggregate', processes=None, use_hash=False):
+    """
+    Build the scenario level KPI tables from the results directory.
+
+    The KPIs of every scenario are cached in {output}/cache.json together with the
+    modification time and size (or the hash) of the files they were computed from. Only
+    scenarios that are new or whose files changed are read again, in a process pool. The
+    tables are written to {output}/kpi_{system_cost,capacity_delta,load_shedding}.csv with
+    one row per scenario and the scenario keys as columns.
+
+    Parameters
+    ----------
+    results : results directory
+    output : directory of the KPI tables and the cache
+    processes : size of the process pool, by default the number of cpus
+    use_hash : bool, key the cache on file contents instead of modification times
+    """
+    os.makedirs(output, exist_ok=True)
+    cache_file = os.path.join(output, 'cache.json')
+    cache = {}
+    if os.path.exists(cache_file):
+        with open(cache_file) as f:
+            cache = json.load(f)
+
+    names = find_scenarios(results)
+    stamps = {name: stamp(scenario_files(results, name), use_hash) for name in names}
+    todo = [name for name in names if name not in cache or cache[name]['stamp'] != stamps[name]]
+    print(f'{len(names)} scenarios, {len(todo)} new or changed')
+
+    if todo:
+        with ProcessPoolExecutor(processes) as pool:
+            for name, kpis in zip(todo, pool.map(_scenario_kpis, [(results, name) for name in todo])):
+                cache[name] = {'stamp': stamps[name], 'kpis': kpis}
+    cache = {name: cache[name] for name in names}
+
+    #write the cache atomically so an interrupted run does not corrupt it
+    with open(cache_file + '.tmp', 'w') as f:
+        json.dump(cache, f)
+    os.replace(cache_file + '.tmp', cache_file)
+
+    keys = pd.DataFrame([scenario_keys(name) for name in names]).set_index('scenario')
+    for kpi in kpi_tables:
+        table = pd.DataFrame({name: cache[name]['kpis'][kpi] for name in names}).T
+        table = keys.join(table)
+        table.index.name = 'scenario'
+        table.to_csv(os.path.join(output, f'kpi_{kpi}.csv'))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Aggregate the scenario results into KPI tables.')
+    parser.add_argument('--results', default='results')
+    parser.add_argument('--output', default='results/aggregate')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--hash', action='store_true', help='key the cache on file contents instead of modification times')
+    args = parser.parse_args()
+
+    aggregate(args.results, args.output, args.processes, args.hash)
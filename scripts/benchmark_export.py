@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import tempfile
+import pandas as pd
+import pypsa
+from _helpers import export_netcdf, export_stats
+
+#export profiles compared, see the export section of the solving config
+profiles = {
+    'full': dict(content='full', complevel=0, shuffle=False, float32=False),
+    'full_zlib1': dict(content='full', complevel=1, shuffle=True, float32=False),
+    'full_zlib4': dict(content='full', complevel=4, shuffle=True, float32=False),
+    'full_zlib4_float32': dict(content='full', complevel=4, shuffle=True, float32=True),
+    'solution': dict(content='solution', complevel=0, shuffle=False, float32=False),
+    'solution_zlib4': dict(content='solution', complevel=4, shuffle=True, float32=False),
+    'solution_zlib4_float32': dict(content='solution', complevel=4, shuffle=True, float32=True),
+}
+
+def benchmark_export(network_file, output='results/export_benchmark.csv'):
+    """
+    Save and load a solved network with every export profile and record the timings and file sizes.
+
+    Parameters
+    ----------
+    network_file : path of a solved network
+    output : csv with one row per profile
+    """
+    n = pypsa.Network(network_file)
+    rows = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, profile in profiles.items():
+            fn = os.path.join(tmpdir, f'{name}.nc')
+            start = time.perf_counter()
+            export_netcdf(n, fn, **profile)
+            rows[name] = {**profile, **export_stats(fn, time.perf_counter() - start)}
+
+    result = pd.DataFrame(rows).T
+    print(result.to_string())
+    result.to_csv(output)
+    return result
+
+if __name__ == "__main__":
+    network_file = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else 'results/export_benchmark.csv'
+    benchmark_export(network_file, output)
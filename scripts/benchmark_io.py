@@ -0,0 +1,44 @@
+import sys
+import time
+import pandas as pd
+import pypsa
+from _helpers import optimize, solver_kwargs, solver_stats
+
+#ways linopy passes the model to the solver, see io_api in the solver config
+io_apis = ['lp', 'mps', 'direct']
+
+def benchmark_io(network_file, output='results/io_benchmark.csv', repeat=1):
+    """
+    Solve the base model with every io_api and record the wall times.
+
+    Each run builds and solves a fresh copy of the network with the solver options of the
+    base stage. wall_time covers model build, transfer to the solver, solve and reading
+    the solution back, runtime is the time reported by the solver itself (gurobi only),
+    so their difference is the overhead of the io path.
+
+    Parameters
+    ----------
+    network_file : path of a base network
+    output : csv with one row per io_api and run
+    repeat : int, runs per io_api
+    """
+    n = pypsa.Network(network_file)
+    rows = {}
+    for io_api in io_apis:
+        for i in range(repeat):
+            m = n.copy()
+            start = time.perf_counter()
+            status, condition = optimize(m, **solver_kwargs('base', io_api=io_api))
+            stats = solver_stats(m, time.perf_counter() - start)
+            rows[(io_api, i)] = {**stats, 'overhead': stats['wall_time'] - stats['runtime'], 'status': status}
+
+    result = pd.DataFrame(rows).T.rename_axis(['io_api', 'run'])
+    print(result.to_string())
+    result.to_csv(output)
+    return result
+
+if __name__ == "__main__":
+    network_file = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else 'results/io_benchmark.csv'
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    benchmark_io(network_file, output, repeat)
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import tempfile
+import pandas as pd
+import pypsa
+from _helpers import no_inv, optimize, resample_network, solve_scenario, solver_environment, solver_kwargs
+from solve_screening import scenario_impact, screening_options, system_cost
+from solve_threshold import load_shedding
+
+def solve_scenarios(n, input_file, country, o, tl, bus, scenarios, tmpdir, env, tag):
+    """
+    Reference dispatch of the capacities of the solved base network n and every scenario
+    solved against n, as in solve_screening.py. The networks go to tmpdir and no results
+    tables are written.
+
+    Returns
+    -------
+    pd.DataFrame with the impact (see scenario_impact) and the wall time of each scenario,
+    wall time of the reference
+    """
+    options = screening_options()
+    start = time.perf_counter()
+    n_ref = n.copy()
+    no_inv(n_ref, n)
+    optimize(n_ref, **solver_kwargs('noinv', env=env))
+    ref_time = time.perf_counter() - start
+    ref_cost, ref_shedding = system_cost(n_ref), load_shedding(n_ref, country)
+
+    rows = {}
+    for scenario in scenarios:
+        contingency, reductionto, duration, model = scenario.split(':')
+        print(f'screening benchmark {contingency} {model}{tag}: reductionto {reductionto}, duration {duration}')
+        start = time.perf_counter()
+        n_new = solve_scenario(input_file, os.path.join(tmpdir, f'{scenario.replace(":", "_")}{tag}.nc'), contingency, reductionto, duration,
+                               model, country, o, tl, bus, n=n, env=env, tag=tag, statistics=False)
+        rows[scenario] = {**scenario_impact(n_new, n, model, country, ref_cost, ref_shedding, options),
+                          'wall_time': time.perf_counter() - start}
+    return pd.DataFrame(rows).T, ref_time
+
+def benchmark_screening(input_file, country, o, tl, bus, scenarios, output='results/screening_benchmark.csv'):
+    """
+    Solve every scenario at the screening resolution and at full resolution and compare them.
+
+    The screening is consistent with the full resolution solves if it ranks the scenarios
+    alike (Spearman rank correlation of the cost increase and of the load shedding) and
+    misses no scenario of interest at full resolution. The contingencies in full_resolution
+    of the screening section are solved at both resolutions as well, but are never dropped.
+    The solves saved are the full resolution solves of the scenarios the screening drops,
+    their time saved is set off against the time of all screening solves.
+
+    Parameters
+    ----------
+    input_file : path of the solved base network
+    country, o, tl, bus : as for the per-scenario scripts
+    scenarios : list of 'contingency:reductionto:duration:model' strings
+    output : csv with one row per scenario, the screening columns end in _screening
+    """
+    options = screening_options()
+    hours = int(options['resolution'])
+    n = pypsa.Network(input_file)
+
+    with solver_environment() as env, tempfile.TemporaryDirectory() as tmpdir:
+        coarse_file = os.path.join(tmpdir, f'base_{hours}h.nc')
+        n_coarse = resample_network(n, hours)
+        n_coarse.export_to_netcdf(coarse_file)
+        screening, screening_ref = solve_scenarios(n_coarse, coarse_file, country, o, tl, bus, scenarios, tmpdir, env, f'_{hours}h_benchmark')
+        full, full_ref = solve_scenarios(n, input_file, country, o, tl, bus, scenarios, tmpdir, env, '_benchmark')
+
+    result = full.join(screening.add_suffix('_screening'))
+    #contingencies in full_resolution are always solved at full resolution, see solve_screening
+    result['screened'] = [scenario.split(':')[0] not in options['full_resolution'] for scenario in result.index]
+    dropped = result.screened & ~result.interest_screening.astype(bool)
+    summary = pd.Series({
+        'resolution': f'{hours}h',
+        'scenarios': len(result),
+        'spearman_cost_increase': result.cost_increase.astype(float).corr(result.cost_increase_screening.astype(float), method='spearman'),
+        'spearman_load_shedding': result.load_shedding.astype(float).corr(result.load_shedding_screening.astype(float), method='spearman'),
+        'interest_full': int(result.interest.sum()),
+        'interest_screening': int((result.interest_screening.astype(bool) | ~result.screened).sum()),
+        'missed': int((result.interest.astype(bool) & dropped).sum()),
+        'solves_saved': int(dropped.sum()),
+        'time_saved': result.wall_time[dropped].sum() - result.wall_time_screening[result.screened].sum() - screening_ref,
+        'time_full': result.wall_time.sum() + full_ref,
+    })
+    print(result.to_string())
+    print(summary.to_string())
+    result.to_csv(output)
+    return result, summary
+
+if __name__ == "__main__":
+    input_file = sys.argv[1]
+    output = sys.argv[2]
+    country = str(sys.argv[3])
+    o = sys.argv[4]
+    tl = sys.argv[5]
+    bus = sys.argv[6]
+    scenarios = sys.argv[7:]
+
+    benchmark_screening(input_file, country, o, tl, bus, scenarios, output)
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import subprocess
+import pandas as pd
+
+#modules every solve script imported at start before the imports were trimmed
+removed_imports = ['matplotlib.pyplot', 'pypsa.plot', 'gurobipy', 'cartopy.crs', 'matplotlib.cm', 'xarray', 'seaborn']
+
+def import_time(statement, repeat=5):
+    """
+    Median wall time in seconds of running statement in a fresh interpreter, NaN if it fails.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', statement], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True)
+        if result.returncode:
+            print(f'{statement!r} failed: {result.stderr.decode().strip().splitlines()[-1]}')
+            return float('nan')
+        times.append(time.perf_counter() - start)
+    return pd.Series(times).median()
+
+def benchmark_startup(output='results/startup_benchmark.csv', repeat=5):
+    """
+    Time the start of the solve scripts in fresh interpreters.
+
+    For each script the import of the module (what every Snakemake job pays before
+    solving) is timed, next to the import of the plotting stack and solver bindings the
+    scripts imported before and an empty interpreter as reference.
+    """
+    statements = {'python': 'pass', '_helpers': 'import _helpers', 'removed imports': 'import ' + ', '.join(removed_imports)}
+    for script in ['solve_base', 'solve_pv', 'solve_wind', 'solve_windpv', 'solve_drought', 'solve_noexim', 'solve_batch']:
+        statements[script] = f'import {script}'
+        statements[f'{script} + removed imports'] = f'import {script}, ' + ', '.join(removed_imports)
+
+    result = pd.Series({name: import_time(statement, repeat) for name, statement in statements.items()}, name='seconds')
+    print(result.to_string())
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    result.to_csv(output)
+    return result
+
+if __name__ == "__main__":
+    output = sys.argv[1] if len(sys.argv) > 1 else 'results/startup_benchmark.csv'
+    benchmark_startup(output)
@@ -0,0 +1,169 @@
+import sys
+import os
+import importlib
+import tempfile
+import pypsa
+from _helpers import (add_EQ_constraints, contingency_scripts, export_network, solve_model, solve_scenario, solver_environment,
+                      solver_kwargs, solving_options, update_operational_limits)
+
+#operational limits changed by each contingency and the time series they are built from,
+#drought also changes the storage inflow and is always solved per scenario
+sweep_limits = {
+    'pv': [('Generator', 'p')],
+    'wind': [('Generator', 'p')],
+    'windpv': [('Generator', 'p')],
+    'noexim': [('Line', 's'), ('Link', 'p')],
+}
+sweep_series = {'Generator': ['p_max_pu'], 'Line': ['s_max_pu'], 'Link': ['p_max_pu', 'p_min_pu']}
+
+def parse_scenario(scenario):
+    """
+    Split a scenario given as 'contingency:reductionto:duration:model', e.g. 'pv:0.25:90:inv'.
+    """
+    contingency, reductionto, duration, model = scenario.split(':')
+    return contingency, reductionto, duration, model
+
+def scenario_file(country, bus, tl, contingency, reductionto, duration, model):
+    """
+    Output file of one scenario, named like the output of the dynamic_solve rule.
+    """
+    return f'resources/{country}_{bus}_{tl}_{contingency}_{reductionto}_{duration}_{model}.nc'
+
+def sweep_conflicts(solving, model):
+    """
+    Solving modes of the per-scenario solves of model that the severity sweep does not apply:
+    the two step and check equity solves of inv, the window solve of noinv and the warm start.
+    The severities of a contingency are solved per scenario if any of them is set.
+    """
+    conflicts = []
+    if model == 'inv' and solving['equity'] != 'single':
+        conflicts.append(f"equity {solving['equity']}")
+    if model == 'noinv' and solving['window']['enable']:
+        conflicts.append('window')
+    if solving['warm_start']:
+        conflicts.append('warm_start')
+    return conflicts
+
+def solve_batch(input_file, scenarios, country, o, tl, bus):
+    """
+    Solve many contingency scenarios against one base network in a single process.
+
+    The solved base network is read once, the contingency scripts are imported once and
+    with gurobi all solves share one Gurobi environment. Each scenario writes the same
+    perfect foresight .nc and csv outputs as running its solve_{contingency}.py script on
+    its own, the rolling horizon of each scenario is solved by solve_roll.py. With severity_sweep
+    in the solving config, the severities of a contingency are solved on one model build,
+    see solve_severity_sweep. Models whose solving modes the sweep does not apply are solved per
+    scenario, see sweep_conflicts.
+
+    Parameters
+    ----------
+    input_file : path of the solved base network
+    scenarios : list of 'contingency:reductionto:duration:model' strings
+    country, o, tl, bus : as for the per-scenario scripts
+    """
+    n = pypsa.Network(input_file)
+
+    solving = solving_options()
+    scenarios = [parse_scenario(scenario) for scenario in scenarios]
+
+    #group the severities of each contingency, duration and model for the severity sweep
+    conflicts = {model: sweep_conflicts(solving, model) for model in ('inv', 'noinv')}
+    if solving['severity_sweep']:
+        for model, modes in conflicts.items():
+            if modes:
+                print(f'severity sweep of {model} solved per scenario, it does not apply {", ".join(modes)}')
+    groups = {}
+    for contingency, reductionto, duration, model in scenarios:
+        if solving['severity_sweep'] and contingency in sweep_limits and not conflicts[model]:
+            key = (contingency, duration, model)
+        else:
+            key = (contingency, reductionto, duration, model)
+        groups.setdefault(key, []).append(reductionto)
+
+    with solver_environment() as env:
+        for key, reductiontos in groups.items():
+            contingency, duration, model = key[0], key[-2], key[-1]
+            print(f'solving {contingency} {reductiontos} {duration} {model} for {country}_{bus}_{tl}')
+            if len(key) == 3:
+                script = importlib.import_module(contingency_scripts[contingency])
+                cut_kwargs = dict(country=country) if contingency == 'noexim' else dict(carriers_to_cut=script.carriers_to_cut)
+                solve_severity_sweep(script, input_file, n, contingency, reductiontos, duration, model, country, o, tl, bus, env, **cut_kwargs)
+                continue
+
+            output_file = scenario_file(country, bus, tl, contingency, reductiontos[0], duration, model)
+            solve_scenario(input_file, output_file, contingency, reductiontos[0], duration, model, country, o, tl, bus, n=n, env=env)
+
+def solve_severity_sweep(script, input_file, n, contingency, reductiontos, duration, model, country, o, tl, bus, env, **cut_kwargs):
+    """
+    Solve all severities of one contingency, duration and model on a single model build.
+
+    The model is built once for the first severity. For each further severity the cut is
+    applied again to the base time series and only the affected operational limits of the
+    model are updated (generator availability, or line and link limits for noexim). With
+    gurobi each solve restarts from the basis of the previous one, with dual simplex instead of
+    a barrier solve of the stage. inv is solved with the single pass equity constraint, other
+    solving modes are not applied (see sweep_conflicts). Outputs are written per severity
+    under the same names as the per-scenario solves.
+
+    Parameters
+    ----------
+    script : contingency script module
+    input_file : path of the solved base network
+    n : solved base pypsa.Network
+    reductiontos : list of severities as given in the scenario names
+    cut_kwargs : carriers_to_cut or country, passed on to script.apply_contingency
+    """
+    duration = int(duration)
+    solver = solver_kwargs(model, env=env)
+    resources = solver.pop('solver_options')
+    #a barrier solve without crossover would replace the dual simplex restarts
+    solver.pop('barrier', None)
+
+    n_new = n.copy()
+    script.apply_contingency(n, n_new, float(reductiontos[0]), duration, **cut_kwargs)
+    if model == 'inv':
+        if contingency == 'noexim':
+            script.allow_inv(n_new, n, country)
+        else:
+            script.allow_inv(n_new, n)
+    else:
+        script.no_inv(n_new, n)
+
+    n_new.optimize.create_model()
+    if model == 'inv':
+        add_EQ_constraints(n_new, o)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        warmstart_fn = None
+        for i, rt in enumerate(reductiontos):
+            reductionto = float(rt)
+            if i:
+                #cut the base time series again and move only the changed limits into the model
+                for c, attr in sweep_limits[contingency]:
+                    for series in sweep_series[c]:
+                        n_new.pnl(c)[series] = n.pnl(c)[series].copy()
+                script.apply_contingency(n, n_new, reductionto, duration, **cut_kwargs)
+                for c, attr in sweep_limits[contingency]:
+                    update_operational_limits(n_new, c, attr)
+
+            n_new.name = f'{contingency}_{country}_{bus}_{tl}_{reductionto}_{duration}_{model}'
+            basis_fn = os.path.join(tmpdir, f'{i}.bas')
+            if solver['solver_name'] == 'gurobi':
+                solver_options = {**resources, 'Method': 1} if warmstart_fn else resources
+                solve_model(n_new, basis_fn=basis_fn, warmstart_fn=warmstart_fn, solver_options=solver_options, **solver)
+                warmstart_fn = basis_fn if os.path.exists(basis_fn) else None
+            else:
+                solve_model(n_new, solver_options=resources, **solver)
+            script.export_statistics(n_new, country)
+            export_network(n_new, scenario_file(country, bus, tl, contingency, rt, duration, model), n, input_file, lossless=True)
+
+if __name__ == "__main__":
+    input_file = sys.argv[1]
+    country = str(sys.argv[2])
+    o = sys.argv[3]
+    tl = sys.argv[4]
+    bus = sys.argv[5]
+    scenarios = sys.argv[6:]
+
+    solve_batch(input_file, scenarios, country, o, tl, bus)
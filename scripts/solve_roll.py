@@ -0,0 +1,54 @@
+import sys
+import pypsa
+from _helpers import export_network, export_statistics, load_network, mod_rh_storage, no_inv, optimize_rolling_horizon, solver_kwargs, solving_options
+
+def roll_name(name):
+    """
+    Name of the rolling horizon network of a perfect foresight network, e.g.
+    DE_1.0_base_solved -> DE_1.0_base_roll_solved, pv_DE_20_1.0_0.25_90_inv -> pv_DE_20_1.0_0.25_90_invroll.
+    """
+    if name.endswith('_base_solved'):
+        return name[:-len('_solved')] + '_roll_solved'
+    return f'{name}roll'
+
+def solve_roll(input_file, output_file, horizon, country, base_file=None):
+    """
+    Solve the rolling horizon model of a solved perfect foresight network.
+
+    The capacities are fixed to the perfect foresight solution, storage units are
+    dispatched with its mean storage value as marginal cost and start from the storage
+    levels of the base network. Runs as its own Snakemake rule after solve_base.py or a
+    solve_{contingency}.py script, so a change of the horizon only re-runs this stage.
+
+    Parameters
+    ----------
+    input_file : path of the solved perfect foresight network
+    output_file : path of the solved rolling horizon network
+    horizon : int, number of snapshots per window
+    country : str, country code of the study region
+    base_file : path of the solved base network for contingency networks, None for the base network itself
+    """
+    n_pf = load_network(input_file)
+    n_base = pypsa.Network(base_file) if base_file else None
+
+    n_roll = n_pf.copy()
+    n_roll.name = roll_name(n_pf.name)
+    no_inv(n_roll, n_pf)
+    n_roll.storage_units['cyclic_state_of_charge'] = False
+    n_roll.storage_units['cyclic_state_of_charge_per_period'] = False
+    mod_rh_storage(n_roll, n_pf, n_base)
+
+    solving = solving_options()
+    optimize_rolling_horizon(n_roll, n_pf, horizon, **solving['rolling_horizon'], **solver_kwargs('rolling_horizon'))
+    export_statistics(n_roll, country, n_pf)
+
+    export_network(n_roll, output_file, n_base, base_file)
+
+if __name__ == "__main__":
+    input_file = sys.argv[1]
+    output_file = sys.argv[2]
+    horizon = int(sys.argv[3])
+    country = str(sys.argv[4])
+    base_file = sys.argv[5] if len(sys.argv) > 5 else None
+
+    solve_roll(input_file, output_file, horizon, country, base_file)
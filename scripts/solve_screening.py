@@ -0,0 +1,116 @@
+import sys
+import os
+import pandas as pd
+import pypsa
+from _helpers import export_network, export_statistics, load_config, no_inv, optimize, resample_network, solve_scenario, solver_environment, solver_kwargs
+from solve_batch import scenario_file
+from solve_threshold import extra_investment, load_shedding
+
+def screening_options(config=None):
+    """
+    Options of the screening section of the configuration, with defaults for missing entries.
+    """
+    if config is None:
+        config = load_config()
+    options = {
+        'enable': False,
+        'resolution': 24,
+        'min_shedding': 1.,
+        'min_cost_increase': 0.01,
+        'min_investment': 1.,
+        'full_resolution': ['pv', 'windpv'],
+    }
+    options.update(config.get('screening') or {})
+    return options
+
+def system_cost(n):
+    """
+    Capital and operational cost of all assets of the solved network n in €.
+    """
+    comps = ["Generator", "StorageUnit", "Line", "Link", "Transformer"]
+    return n.statistics.capex(comps=comps).sum() + n.statistics.opex(comps=comps).sum()
+
+def scenario_impact(n_new, n_base, model, country, ref_cost, ref_shedding, options):
+    """
+    Cost increase (relative), load shedding and extra investment of the solved scenario n_new
+    over the reference dispatch of n_base, and whether they make it a scenario of interest.
+    """
+    cost_increase = (system_cost(n_new) - ref_cost) / ref_cost
+    shedding = load_shedding(n_new, country) - ref_shedding
+    investment = extra_investment(n_new, n_base) if model == 'inv' else 0.
+    return {'cost_increase': cost_increase, 'load_shedding': shedding, 'extra_investment': investment,
+            'interest': (cost_increase > options['min_cost_increase'] or shedding > options['min_shedding']
+                         or investment > options['min_investment'])}
+
+def solve_screening(input_file, output_file, country, o, tl, bus, scenarios):
+    """
+    Solve every contingency scenario of a base network at a coarse temporal resolution and
+    flag the scenarios worth a full resolution solve.
+
+    The solved base network is resampled to the resolution of the screening section (see
+    _helpers.resample_network) and written next to it with the tag _{hours}h. Its
+    capacities are dispatched once at that resolution as reference. Each scenario is then
+    solved with its solve_{contingency}.py script against the resampled network, so the
+    networks and results tables land in the usual layout with the resolution tag, e.g.
+    syscost_pv_DE_20_1.0_0.25_90_inv_24h.csv. A scenario is of interest if its system cost
+    exceeds the reference by more than min_cost_increase (relative), its load shedding in
+    the country by more than min_shedding or, for inv, more than min_investment is built on
+    top of the base capacities. The contingencies in full_resolution are not screened and
+    always of interest: averaging the solar profile over the coarse snapshots hides the
+    impact of solar cuts (scripts/benchmark_screening.py compares the screening with the
+    full resolution solves).
+
+    Parameters
+    ----------
+    input_file : path of the solved base network
+    output_file : csv with one row per scenario and its interest flag, read by the Snakefile
+    country, o, tl, bus : as for the per-scenario scripts
+    scenarios : list of 'contingency:reductionto:duration:model' strings
+    """
+    options = screening_options()
+    hours = int(options['resolution'])
+    tag = f'_{hours}h'
+
+    n = pypsa.Network(input_file)
+    n_coarse = resample_network(n, hours)
+    coarse_file = f'{os.path.splitext(input_file)[0]}{tag}.nc'
+    export_network(n_coarse, coarse_file, lossless=True)
+
+    rows = []
+    with solver_environment() as env:
+        #reference: the base capacities dispatched at the coarse resolution
+        n_ref = n_coarse.copy()
+        no_inv(n_ref, n_coarse)
+        optimize(n_ref, **solver_kwargs('noinv', env=env))
+        export_statistics(n_ref, country)
+        ref_cost = system_cost(n_ref)
+        ref_shedding = load_shedding(n_ref, country)
+
+        for scenario in scenarios:
+            contingency, reductionto, duration, model = scenario.split(':')
+            if contingency in options['full_resolution']:
+                rows.append({'contingency': contingency, 'reductionto': reductionto, 'duration': duration, 'model': model, 'interest': True})
+                continue
+            output = scenario_file(country, bus, tl, contingency, reductionto, duration, model)
+            print(f'screening {contingency} {model} at {hours}h: reductionto {reductionto}, duration {duration}')
+            n_new = solve_scenario(coarse_file, f'{os.path.splitext(output)[0]}{tag}.nc', contingency, reductionto, duration, model,
+                                   country, o, tl, bus, n=n_coarse, env=env, tag=tag)
+            rows.append({'contingency': contingency, 'reductionto': reductionto, 'duration': duration, 'model': model,
+                         **scenario_impact(n_new, n_coarse, model, country, ref_cost, ref_shedding, options)})
+
+    screening = pd.DataFrame(rows)
+    screening['resolution'] = f'{hours}h'
+    screening.to_csv(output_file, index=False)
+    print(f"{screening.interest.sum()} of {len(screening)} scenarios of interest")
+    print(screening.to_string())
+
+if __name__ == "__main__":
+    input_file = sys.argv[1]
+    output_file = sys.argv[2]
+    country = str(sys.argv[3])
+    o = sys.argv[4]
+    tl = sys.argv[5]
+    bus = sys.argv[6]
+    scenarios = sys.argv[7:]
+
+    solve_screening(input_file, output_file, country, o, tl, bus, scenarios)
@@ -0,0 +1,190 @@
+import os
+import sys
+import pandas as pd
+import pypsa
+from _helpers import load_config, solve_scenario, solver_environment
+
+#capacities built on top of the base network in inv models, as extended by allow_inv
+investment_attrs = {'Generator': 'p_nom', 'StorageUnit': 'p_nom', 'Line': 's_nom', 'Link': 'p_nom'}
+
+def probe_file(country, bus, tl, contingency, reductionto, duration, model):
+    """
+    Output file of a threshold probe, apart from the scenario files of the dynamic_solve rule.
+    """
+    return f'resources/threshold/{country}_{bus}_{tl}_{contingency}_{reductionto}_{duration}_{model}_probe.nc'
+
+def search_options(config=None):
+    """
+    Options of the threshold_search section of the configuration, with defaults for missing entries.
+    """
+    if config is None:
+        config = load_config()
+    options = {
+        'axis': 'reductionto',
+        'tol_reductionto': 0.05,
+        'tol_duration': 7,
+        'min_duration': 1,
+        'max_duration': 365,
+        'min_shedding': 1.,
+        'min_investment': 1.,
+    }
+    options.update(config.get('threshold_search') or {})
+    return options
+
+def contingency_grid(config, contingency):
+    """
+    reductionto and duration values configured for a contingency.
+    """
+    reductiontos, durations = [], []
+    for entry in config['contingencies']:
+        for param in entry.get(contingency, []):
+            reductiontos = param.get('reductionto', reductiontos)
+            durations = param.get('duration', durations)
+    return [float(rt) for rt in reductiontos], [int(dur) for dur in durations]
+
+def load_shedding(n, country):
+    """
+    Load shedding in the country in MWh.
+    """
+    shed = n.generators.index[(n.generators.carrier == 'load') & (n.generators.bus.str[:2] == country)]
+    return n.generators_t.p[shed].mul(n.snapshot_weightings.generators, axis=0).sum().sum()
+
+def extra_investment(n, n_base):
+    """
+    Capacity in MW built on top of the base network, summed over generators, storage units, lines and links.
+    """
+    total = 0.
+    for c, attr in investment_attrs.items():
+        opt = n.df(c)[f'{attr}_opt']
+        total += (opt - n_base.df(c)[f'{attr}_opt'].reindex(opt.index).fillna(0)).clip(lower=0).sum()
+    return total
+
+def network_days(n):
+    """
+    Longest cut in whole days that fits into the snapshots of n, as counted by the period searches of the contingency scripts.
+    """
+    timestep = (n.snapshots[1] - n.snapshots[0]).total_seconds() / 86400
+    return int(len(n.snapshots) * timestep + 1e-9)
+
+def bisect(impact, severe, mild, tol, integer=False):
+    """
+    Narrow the interval between a severe value with impact and a mild value without impact.
+
+    Parameters
+    ----------
+    impact : callable(value) -> bool, monotone between severe and mild
+    severe, mild : bounds of the search, severe may be larger or smaller than mild
+    tol : width of the returned interval
+    integer : bool, only probe whole numbers
+
+    Returns
+    -------
+    the mildest value with impact and the most severe value without impact found
+    """
+    while abs(mild - severe) > tol:
+        mid = (severe + mild) / 2
+        if integer:
+            mid = int(round(mid))
+            if mid in (severe, mild):
+                break
+        if impact(mid):
+            severe = mid
+        else:
+            mild = mid
+    return severe, mild
+
+def solve_threshold(input_file, output_file, country, o, tl, bus, contingency, model):
+    """
+    Find the severity at which a contingency starts to cause load shedding or, for the inv
+    model, extra investment, by bisection instead of a fixed grid.
+
+    With axis reductionto, reductionto is bisected in [0, 1] for each duration configured
+    for the contingency: a scenario has impact if its load shedding in the country exceeds
+    that of the base network by more than min_shedding or, for inv, if more than
+    min_investment is built on top of the base capacities. reductionto 1 equals the base
+    network and is not solved. With axis duration, the duration is bisected in
+    [min_duration, max_duration] for each configured reductionto below 1, max_duration
+    clamped to the days the network spans (see network_days). Each bisection needs 1-2
+    solves for its bounds and about log2(range / tol) further ones. Durations that do not
+    fit into the network are not searched, their rows say so in the column note.
+
+    Every probe is solved with the solve_{contingency}.py script. Its network goes to
+    resources/threshold/ (see probe_file) and is named with the tag _probe, no results
+    tables are written, so the probes neither overwrite the outputs of the dynamic_solve
+    and solve_batch rules nor enter the results store. The load shedding and extra
+    investment of the probes go to results/thresholdprobes_*.csv, the thresholds to
+    output_file with one row per searched line: the mildest value with impact and the
+    most severe one without, NaN if no probe (or every probe) has impact.
+
+    Parameters
+    ----------
+    input_file : path of the solved base network
+    output_file : csv of the thresholds
+    country, o, tl, bus, contingency, model : as for the per-scenario scripts
+    """
+    config = load_config()
+    options = search_options(config)
+    reductiontos, durations = contingency_grid(config, contingency)
+
+    n = pypsa.Network(input_file)
+    days = network_days(n)
+    base_shedding = load_shedding(n, country)
+
+    probes = {}
+    os.makedirs('resources/threshold', exist_ok=True)
+
+    def impact(reductionto, duration):
+        if (reductionto, duration) not in probes:
+            rt = f'{reductionto:g}'
+            print(f'threshold search {contingency} {model}: solving reductionto {rt}, duration {duration}')
+            n_new = solve_scenario(input_file, probe_file(country, bus, tl, contingency, rt, duration, model), contingency, rt, duration,
+                                   model, country, o, tl, bus, n=n, env=env, tag='_probe', statistics=False)
+            shedding = load_shedding(n_new, country) - base_shedding
+            investment = extra_investment(n_new, n) if model == 'inv' else 0.
+            probes[(reductionto, duration)] = {'load_shedding': shedding, 'extra_investment': investment,
+                                               'impact': shedding > options['min_shedding'] or investment > options['min_investment']}
+        return probes[(reductionto, duration)]['impact']
+
+    thresholds = []
+    with solver_environment() as env:
+        if options['axis'] == 'reductionto':
+            for duration in durations:
+                row = {'axis': 'reductionto', 'duration': duration, 'impact': None, 'no_impact': None, 'note': None}
+                if duration > days:
+                    row['note'] = f'longer than the {days} days of the network'
+                elif impact(0., duration):
+                    row['impact'], row['no_impact'] = bisect(lambda rt: impact(rt, duration), 0., 1., options['tol_reductionto'])
+                thresholds.append(row)
+        elif options['axis'] == 'duration':
+            lo, hi = int(options['min_duration']), min(int(options['max_duration']), days)
+            for reductionto in [rt for rt in reductiontos if rt < 1]:
+                row = {'axis': 'duration', 'reductionto': reductionto, 'impact': None, 'no_impact': None, 'note': None}
+                if hi < int(options['max_duration']):
+                    row['note'] = f'max_duration clamped to the {days} days of the network'
+                if lo > hi:
+                    row['note'] = f'min_duration longer than the {days} days of the network'
+                elif impact(reductionto, hi) and not impact(reductionto, lo):
+                    row['impact'], row['no_impact'] = bisect(lambda dur: impact(reductionto, dur), hi, lo, options['tol_duration'], integer=True)
+                thresholds.append(row)
+        else:
+            raise ValueError(f"threshold search axis must be 'reductionto' or 'duration', got {options['axis']!r}")
+
+    name = f'{country}_{bus}_{tl}_{contingency}_{model}'
+    probes = pd.DataFrame(probes).T.rename_axis(['reductionto', 'duration'])
+    probes.to_csv(f'results/thresholdprobes_{name}.csv')
+    thresholds = pd.DataFrame(thresholds)
+    thresholds['solves'] = len(probes)
+    thresholds.to_csv(output_file, index=False)
+    print(thresholds.to_string())
+
+if __name__ == "__main__":
+    input_file = sys.argv[1]
+    output_file = sys.argv[2]
+    country = str(sys.argv[3])
+    o = sys.argv[4]
+    tl = sys.argv[5]
+    bus = sys.argv[6]
+    contingency = sys.argv[7]
+    model = sys.argv[8]
+
+    solve_threshold(input_file, output_file, country, o, tl, bus, contingency, model)
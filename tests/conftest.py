@@ -0,0 +1,79 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, 'scripts'))
+
+
+def small_network(days=14):
+    """
+    Two country network at 3h resolution with the carriers the contingency scripts cut,
+    load shedding, storage units with and without inflow, a line and a link.
+    """
+    pypsa = pytest.importorskip('pypsa')
+    sns = pd.date_range('2013-01-01', periods=days * 8, freq='3h')
+    hours = np.arange(len(sns)) * 3
+    rng = np.random.default_rng(0)
+
+    n = pypsa.Network()
+    n.set_snapshots(sns)
+    n.snapshot_weightings.loc[:, :] = 3.
+    n.add('Bus', 'DE0 0', carrier='AC')
+    n.add('Bus', 'FR0 0', carrier='AC')
+    n.buses['country'] = n.buses.index.str[:2]
+    for bus in n.buses.index:
+        solar = np.clip(np.sin((hours % 24 - 6) / 12 * np.pi), 0, None) * rng.uniform(0.5, 1, len(sns))
+        wind = np.clip(0.4 + 0.3 * np.sin(hours / 100 + rng.uniform(0, 6)) + 0.1 * rng.standard_normal(len(sns)), 0, 1)
+        n.add('Load', bus, bus=bus, p_set=1000 + 200 * np.sin((hours % 24 - 8) / 24 * 2 * np.pi))
+        n.add('Generator', f'{bus} solar', bus=bus, carrier='solar', p_nom=1500, p_max_pu=solar, marginal_cost=0.01)
+        n.add('Generator', f'{bus} onwind', bus=bus, carrier='onwind', p_nom=1200, p_max_pu=wind, marginal_cost=0.02)
+        n.add('Generator', f'{bus} CCGT', bus=bus, carrier='CCGT', p_nom=600, p_nom_extendable=True, capital_cost=1000,
+              marginal_cost=60 + 10 * rng.random())
+        n.add('Generator', f'{bus} load', bus=bus, carrier='load', p_nom=1e5, marginal_cost=15000)
+        n.add('StorageUnit', f'{bus} battery', bus=bus, carrier='battery', p_nom=300, max_hours=6,
+              efficiency_store=0.95, efficiency_dispatch=0.95, cyclic_state_of_charge=True, marginal_cost=0.5)
+    n.add('StorageUnit', 'FR0 0 hydro', bus='FR0 0', carrier='hydro', p_nom=200, max_hours=100, marginal_cost=1,
+          inflow=60 + 40 * np.sin(hours / 50), cyclic_state_of_charge=True)
+    n.add('Line', 'DE0 0-FR0 0', bus0='DE0 0', bus1='FR0 0', x=0.1, s_nom=400, s_max_pu=0.7, carrier='AC')
+    n.add('Link', 'DC DE0 0-FR0 0', bus0='DE0 0', bus1='FR0 0', p_nom=200, p_min_pu=-1, carrier='DC', marginal_cost=0.1)
+    return n
+
+
+@pytest.fixture
+def solver():
+    pytest.importorskip('highspy')
+    return dict(solver_name='highs', solver_options={'output_flag': False})
+
+
+@pytest.fixture
+def solved_base(tmp_path, solver):
+    """
+    Solved small network as read back from its file (the base network of export_delta), and the file.
+    """
+    pypsa = pytest.importorskip('pypsa')
+    from _helpers import optimize
+
+    n = small_network()
+    optimize(n, **solver)
+    base_file = str(tmp_path / 'base_solved.nc')
+    n.export_to_netcdf(base_file)
+    return pypsa.Network(base_file), base_file
+
+
+@pytest.fixture
+def noinv_contingency(solved_base):
+    """
+    Unsolved noinv network of the solved base with the solar availability cut to 0 from
+    2013-01-06 to 2013-01-08, and the cut window.
+    """
+    from _helpers import apply_cut, no_inv
+
+    n, _ = solved_base
+    n_new = n.copy()
+    no_inv(n_new, n)
+    cut_start, cut_end = pd.Timestamp('2013-01-06'), pd.Timestamp('2013-01-08')
+    p_max_pu = n_new.generators_t.p_max_pu
+    apply_cut(p_max_pu, p_max_pu.columns.str.endswith('solar'), cut_start, cut_end, 0.)
+    return n_new, cut_start, cut_end
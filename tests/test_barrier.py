@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+import _helpers
+from _helpers import optimize
+from conftest import small_network
+
+
+@pytest.fixture
+def results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'results').mkdir()
+    return tmp_path / 'results'
+
+
+def barrier_path(n, results):
+    return pd.read_csv(results / f'barrierstats_{n.name}.csv', index_col=0)
+
+
+def test_barrier_accepted(results, solver):
+    n = small_network()
+    n.name = 'test'
+    status, condition = optimize(n, barrier={'tol': 1e-5}, **solver)
+
+    stats = barrier_path(n, results)
+    assert status == 'ok'
+    assert (stats.path == 'barrier').all()
+    assert stats.loc['barrier', 'violation'] <= 1e-5
+
+
+@pytest.mark.parametrize('violation', [np.nan, np.inf, 1.])
+def test_barrier_rejected(results, solver, monkeypatch, violation):
+    monkeypatch.setattr(_helpers, 'solution_violation', lambda n: violation)
+    n = small_network()
+    n.name = 'test'
+    status, condition = optimize(n, barrier={'tol': 1e-5}, **solver)
+
+    stats = barrier_path(n, results)
+    assert status == 'ok'
+    assert (stats.path == 'crossover').all()
+    assert 'crossover' in stats.index
@@ -0,0 +1,15 @@
+import yaml
+from _helpers import load_config, solver_config, solving_options
+
+
+def test_workflow_config(tmp_path, monkeypatch):
+    #the configuration the Snakefile runs with replaces config/config.yaml
+    fn = tmp_path / 'config.yaml'
+    fn.write_text(yaml.safe_dump({'solver': {'name': 'highs', 'io_api': 'lp'}, 'solving': {'window': {'enable': True}}}))
+    monkeypatch.setenv('WORKFLOW_CONFIG', str(fn))
+
+    assert load_config()['solver']['name'] == 'highs'
+    assert solver_config()['io_api'] == 'lp'
+    options = solving_options()
+    assert options['window'] == {'enable': True, 'buffer_days': 14, 'accuracy_report': False}
+    assert options['equity'] == 'single'
@@ -0,0 +1,21 @@
+import pytest
+from _helpers import optimize, optimize_with_equity
+from conftest import small_network
+
+
+@pytest.mark.parametrize('o', ['EQ0.95c', 'EQ0.95'])
+def test_single_pass_matches_two_step(solver, o):
+    n_single, n_two_step, n_free = small_network(), small_network(), small_network()
+    optimize_with_equity(n_single, o, 'single', **solver)
+    optimize_with_equity(n_two_step, o, 'two_step', **solver)
+    optimize(n_free, **solver)
+
+    assert n_single.objective == pytest.approx(n_two_step.objective, rel=1e-6)
+    #the constraint binds, otherwise the test compares two unconstrained solves
+    assert n_single.objective > n_free.objective * (1 + 1e-6)
+
+
+def test_equity_check(solver):
+    n = small_network()
+    status, condition = optimize_with_equity(n, 'EQ0.95c', 'check', **solver)
+    assert status == 'ok'
@@ -0,0 +1,60 @@
+import shutil
+import pandas as pd
+import pytest
+pypsa = pytest.importorskip('pypsa')
+from _helpers import export_delta, load_delta, optimize
+
+
+@pytest.fixture
+def contingency(solved_base, noinv_contingency, solver):
+    n, base_file = solved_base
+    n_new, _, _ = noinv_contingency
+    optimize(n_new, **solver)
+    return n_new, n, base_file
+
+
+def assert_same_network(n_load, n):
+    for c in ['Generator', 'StorageUnit', 'Line', 'Link']:
+        pd.testing.assert_frame_equal(n_load.df(c)[n.df(c).columns], n.df(c), check_dtype=False, check_names=False)
+    pd.testing.assert_frame_equal(n_load.generators_t.p_max_pu, n.generators_t.p_max_pu, check_freq=False, check_like=True, check_names=False)
+    pd.testing.assert_frame_equal(n_load.generators_t.p, n.generators_t.p, check_freq=False, check_like=True, check_names=False)
+    pd.testing.assert_frame_equal(n_load.storage_units_t.state_of_charge, n.storage_units_t.state_of_charge,
+                                  check_freq=False, check_like=True, check_names=False)
+
+
+def test_delta_round_trip(tmp_path, contingency):
+    n_new, n, base_file = contingency
+    fn = str(tmp_path / 'noinv.nc')
+    export_delta(n_new, n, base_file, fn)
+    n_load = load_delta(fn)
+
+    assert n_load.name == n_new.name
+    assert n_load.objective == pytest.approx(n_new.objective)
+    assert_same_network(n_load, n_new)
+
+
+def test_delta_without_objective(tmp_path, contingency):
+    n_new, n, base_file = contingency
+    del n_new.objective
+    fn = str(tmp_path / 'noinv.nc')
+    export_delta(n_new, n, base_file, fn)
+    n_load = load_delta(fn)
+
+    assert not hasattr(n_load, 'objective')
+    assert_same_network(n_load, n_new)
+
+
+def test_delta_moved_with_base(tmp_path, contingency):
+    n_new, n, base_file = contingency
+    (tmp_path / 'resources').mkdir()
+    export_delta(n_new, n, base_file, str(tmp_path / 'resources' / 'noinv.nc'))
+
+    #the delta file finds the base file relative to itself
+    moved = tmp_path / 'moved'
+    moved.mkdir()
+    shutil.move(base_file, moved / 'base_solved.nc')
+    shutil.move(tmp_path / 'resources', moved / 'resources')
+    n_load = load_delta(str(moved / 'resources' / 'noinv.nc'))
+
+    assert n_load.objective == pytest.approx(n_new.objective)
+    assert_same_network(n_load, n_new)
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+import pytest
+from _helpers import find_period_start
+
+
+def loop_period_start(df, num_rows, largest=True):
+    """
+    The search of max_generation_period and min_generation_period before the cumulative sums.
+    """
+    best_sum = 0 if largest else 1e50
+    start = None
+    for start_idx in range(len(df)):
+        if start_idx + num_rows <= len(df):
+            current_sum = df.iloc[start_idx:start_idx + num_rows].sum().sum()
+            if (current_sum > best_sum) if largest else (current_sum < best_sum):
+                best_sum = current_sum
+                start = df.index[start_idx]
+    return start
+
+
+def frames(seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2013-01-01', periods=40, freq='3h')
+    yield pd.DataFrame(rng.random((40, 3)), index=index)
+    #ties: few distinct values, zeros and constant series
+    yield pd.DataFrame(rng.integers(0, 3, (40, 3)).astype(float), index=index)
+    yield pd.DataFrame(np.where(rng.random((40, 2)) < 0.7, 0., 1.), index=index)
+    yield pd.DataFrame(np.ones((40, 2)), index=index)
+    yield pd.DataFrame(np.zeros((40, 2)), index=index)
+    #negative totals, the maximum search never beats its start value 0
+    yield pd.DataFrame(-rng.random((40, 2)), index=index)
+    #large values, where the cumulative sum loses digits
+    yield pd.DataFrame(rng.random((40, 4)) * 1e9 + 1e12, index=index)
+
+
+@pytest.mark.parametrize('largest', [True, False])
+@pytest.mark.parametrize('num_rows', [1, 2, 7, 20, 38, 39, 40, 41])
+def test_find_period_start_matches_loop(num_rows, largest):
+    for seed in range(5):
+        for df in frames(seed):
+            assert find_period_start(df, num_rows, largest) == loop_period_start(df, num_rows, largest)
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+pytest.importorskip('pyarrow')
+from _helpers import read_results, write_table
+
+
+def syscost(value):
+    return pd.DataFrame({'DE': [value, 2 * value], 'FR': [0.5 * value, 0.]}, index=pd.Index(['solar', 'CCGT'], name='carrier'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    root = str(tmp_path / 'store')
+    names = ['pv_DE_20_1.0_0.25_90_inv', 'pv_DE_20_1.0_0.0_90_noinv', 'wind_DE_20_1.5_0.5_180_noinvroll',
+             'pv_DE_20_1.0_0.25_90_inv_24h', 'DE_1.0_base_solved']
+    for i, name in enumerate(names):
+        write_table(syscost(i + 1.), 'syscost', name, store='parquet', root=root)
+    return root
+
+
+def scenarios(df):
+    return sorted(df.scenario.unique())
+
+
+def test_round_trip(store):
+    df = read_results('syscost', root=store, scenario='pv_DE_20_1.0_0.25_90_inv')
+    table = df.pivot(index='carrier', columns='bus_country', values='value')
+    pd.testing.assert_frame_equal(table.loc[['solar', 'CCGT'], ['DE', 'FR']], syscost(1.), check_names=False)
+    assert df.reductionto.eq('0.25').all() and df.tl.eq('1.0').all() and not df.roll.any()
+
+
+def test_filters(store):
+    assert scenarios(read_results('syscost', root=store, tl=1.0, reductionto=0.25)) == ['pv_DE_20_1.0_0.25_90_inv', 'pv_DE_20_1.0_0.25_90_inv_24h']
+    assert scenarios(read_results('syscost', root=store, reductionto=0)) == ['pv_DE_20_1.0_0.0_90_noinv']
+    assert scenarios(read_results('syscost', root=store, duration=[90, 180], bus=20, roll=True)) == ['wind_DE_20_1.5_0.5_180_noinvroll']
+    assert scenarios(read_results('syscost', root=store, country='DE', contingency='pv', model='inv', resolution='24h')) == ['pv_DE_20_1.0_0.25_90_inv_24h']
+    assert scenarios(read_results('syscost', root=store, contingency='base')) == ['DE_1.0_base_solved']
@@ -0,0 +1,60 @@
+import pytest
+from _helpers import mod_rh_storage, no_inv, operational_cost, optimize, optimize_rolling_horizon
+from conftest import small_network
+
+
+@pytest.fixture
+def n_pf(solver):
+    n = small_network()
+    optimize(n, **solver)
+    return n
+
+
+def rolling_network(n_pf):
+    n = n_pf.copy()
+    no_inv(n, n_pf)
+    n.storage_units['cyclic_state_of_charge'] = False
+    mod_rh_storage(n, n_pf)
+    return n
+
+
+def test_parallel_stitching(n_pf, solver):
+    n = rolling_network(n_pf)
+    status, condition = optimize_rolling_horizon(n, n_pf, 24, mode='parallel', processes=2, **solver)
+
+    assert status == 'ok'
+    for df in [n.generators_t.p, n.storage_units_t.state_of_charge, n.lines_t.p0, n.links_t.p0]:
+        assert df.index.equals(n_pf.snapshots)
+        assert not df.isna().any().any()
+    #the objective holds the operational cost without the end storage value, the windows
+    #price the storage dispatch with the marginal cost of the perfect foresight network
+    n.storage_units['marginal_cost'] = n_pf.storage_units.marginal_cost
+    assert n.objective == pytest.approx(operational_cost(n, n.snapshots), rel=1e-6)
+
+
+def soc_set(n):
+    """
+    Fix the state of charge of the batteries at noon of the third day, an input outside of rolling_series.
+    """
+    df = n.storage_units_t.state_of_charge_set.reindex(index=n.snapshots, columns=n.storage_units.index)
+    batteries = n.storage_units.index[n.storage_units.carrier == 'battery']
+    df.loc['2013-01-03 12:00', batteries] = 500.
+    n.storage_units_t.state_of_charge_set = df
+
+
+@pytest.mark.parametrize('prepare', [None, soc_set])
+def test_persistent_matches_sequential(n_pf, solver, prepare):
+    nets = {}
+    for mode in ['sequential', 'persistent']:
+        n = rolling_network(n_pf)
+        if prepare:
+            prepare(n)
+        status, condition = optimize_rolling_horizon(n, n_pf, 16, mode=mode, **solver)
+        assert status == 'ok'
+        nets[mode] = n
+    sequential, persistent = nets['sequential'], nets['persistent']
+
+    assert operational_cost(persistent, persistent.snapshots) == pytest.approx(operational_cost(sequential, sequential.snapshots), rel=1e-6)
+    for c, attr in [('Generator', 'p'), ('StorageUnit', 'p'), ('StorageUnit', 'state_of_charge'), ('Line', 'p0'), ('Link', 'p0')]:
+        diff = persistent.pnl(c)[attr] - sequential.pnl(c)[attr].reindex_like(persistent.pnl(c)[attr])
+        assert diff.abs().max().max() == pytest.approx(0, abs=1e-3), f'{c} {attr}'
@@ -0,0 +1,50 @@
+import pytest
+import yaml
+from _helpers import solver_name, solving_options, solve_scenario
+
+pypsa = pytest.importorskip('pypsa')
+pytest.importorskip('highspy')
+
+import solve_pv
+from solve_batch import scenario_file, solve_batch, sweep_conflicts
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    #scripts write to resources/ and results/ of the working directory
+    config = {
+        'solver': {'name': 'highs', 'options': {'highs': {stage: {'output_flag': False} for stage in ('base', 'inv', 'noinv')}}},
+        'solving': {'severity_sweep': True},
+    }
+    fn = tmp_path / 'config.yaml'
+    fn.write_text(yaml.safe_dump(config))
+    monkeypatch.setenv('WORKFLOW_CONFIG', str(fn))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'resources').mkdir()
+    (tmp_path / 'results').mkdir()
+    solver_name.cache_clear()
+    yield tmp_path
+    solver_name.cache_clear()
+
+
+@pytest.mark.parametrize('model', ['inv', 'noinv'])
+def test_sweep_matches_separate_solves(workdir, solved_base, monkeypatch, model):
+    n, base_file = solved_base
+    monkeypatch.setattr(solve_pv, 'carriers_to_cut', ['solar'])
+    reductiontos = ['0.0', '0.5']
+    solve_batch(base_file, [f'pv:{rt}:3:{model}' for rt in reductiontos], 'DE', 'EQ0.95c', '1.0', '0')
+
+    for rt in reductiontos:
+        n_sweep = pypsa.Network(scenario_file('DE', '0', '1.0', 'pv', rt, '3', model))
+        n_single = solve_scenario(base_file, 'resources/single.nc', 'pv', rt, '3', model, 'DE', 'EQ0.95c', '1.0', '0',
+                                  n=n, statistics=False)
+        assert n_sweep.objective == pytest.approx(n_single.objective, rel=1e-6)
+
+
+def test_sweep_conflicts(workdir):
+    solving = solving_options()
+    assert sweep_conflicts(solving, 'inv') == sweep_conflicts(solving, 'noinv') == []
+    solving = {**solving, 'equity': 'two_step', 'window': {'enable': True}}
+    assert sweep_conflicts(solving, 'inv') == ['equity two_step']
+    assert sweep_conflicts(solving, 'noinv') == ['window']
+    assert sweep_conflicts({**solving, 'warm_start': True}, 'noinv') == ['window', 'warm_start']
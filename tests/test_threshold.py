@@ -0,0 +1,23 @@
+import pytest
+pytest.importorskip('pypsa')
+from conftest import small_network
+from solve_threshold import bisect, network_days
+
+
+def test_network_days():
+    assert network_days(small_network(days=14)) == 14
+    n = small_network(days=60)
+    assert network_days(n) == 60
+    n.set_snapshots(n.snapshots[:-1])
+    assert network_days(n) == 59
+
+
+def test_bisect_duration():
+    probes = []
+
+    def impact(duration):
+        probes.append(duration)
+        return duration >= 23
+
+    assert bisect(impact, 60, 1, 1, integer=True) == (23, 22)
+    assert all(1 < duration < 60 for duration in probes)
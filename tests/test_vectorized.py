@@ -0,0 +1,197 @@
+import importlib
+import os
+import pandas as pd
+import pytest
+import yaml
+pypsa = pytest.importorskip('pypsa')
+from _helpers import allow_inv, export_statistics, no_inv, optimize
+from conftest import small_network
+
+#the per-cell loops the vectorized cuts, capacity transforms and statistics replaced, as
+#they were in the solve_{contingency}.py scripts
+
+
+def legacy_cut(n_new, columns, cut_start, cut_end, reductionto):
+    for column in columns:
+        for index, row in n_new.generators_t.p_max_pu[column].items():
+            if index >= cut_start and index <= cut_end:
+                new_p_max_pu = n_new.generators_t.p_max_pu.at[index, column] * reductionto
+                n_new.generators_t.p_max_pu.at[index, column] = new_p_max_pu
+                if new_p_max_pu < 0:
+                    n_new.generators_t.p_max_pu.at[index, column] = 0
+
+
+legacy_columns = {
+    'pv': lambda columns, carriers: [c for c in columns if c.endswith('solar')],
+    'wind': lambda columns, carriers: [c for c in columns if c.endswith('offwind-ac') or c.endswith('offwind-dc') or c.endswith('onwind')],
+    'windpv': lambda columns, carriers: [c for c in columns for carrier in carriers if carrier in c],
+}
+
+
+def legacy_no_inv(n2, n):
+    for c, nominal in [('generators', 'p_nom'), ('storage_units', 'p_nom'), ('stores', 'e_nom'), ('lines', 's_nom'), ('links', 'p_nom')]:
+        df, df_base = getattr(n2, c), getattr(n, c)
+        for index, value in df[f'{nominal}_extendable'].items():
+            if value:
+                df.at[index, nominal] = df_base.at[index, f'{nominal}_opt']
+                df.at[index, f'{nominal}_extendable'] = False
+
+
+def legacy_allow_inv(n1, n, country=None):
+    if 'lv_limit' in n1.global_constraints.index:
+        n1.global_constraints = n1.global_constraints.drop('lv_limit')
+
+    for c in ['generators', 'storage_units']:
+        df, df_base = getattr(n1, c), getattr(n, c)
+        for index, row in df.iterrows():
+            if row['p_nom_extendable'] == True:
+                df.at[index, 'p_nom_min'] = df_base.at[index, 'p_nom_opt']
+                df.at[index, 'p_nom_extendable'] = True
+            else:
+                df.at[index, 'p_nom'] = df_base.at[index, 'p_nom_opt']
+                df.at[index, 'p_nom_extendable'] = False
+
+    for index, row in n1.lines.iterrows():
+        if row['carrier'] == 'AC' and (country is None or row['bus0'][:2] == row['bus1'][:2]):
+            n1.lines.at[index, 's_nom_min'] = n.lines.at[index, 's_nom_opt']
+            n1.lines.at[index, 's_nom_max'] = n.lines.at[index, 's_nom_opt'] * 1.5
+            n1.lines.at[index, 's_nom_extendable'] = True
+        else:
+            n1.lines.at[index, 's_nom'] = n.lines.at[index, 's_nom_opt']
+            n1.lines.at[index, 's_nom_extendable'] = False
+
+    for index, row in n1.links.iterrows():
+        if row['carrier'] == 'DC' and country is None:
+            n1.links.at[index, 'p_nom_min'] = n.links.at[index, 'p_nom_opt']
+            n1.links.at[index, 'p_nom_max'] = n.links.at[index, 'p_nom_opt'] * 1.5
+            n1.links.at[index, 'p_nom_extendable'] = True
+        elif row['carrier'] == 'DC' and (row['bus0'][:2] == row['bus1'][:2]):
+            n1.links.at[index, 'p_nom'] = n.links.at[index, 'p_nom_opt']
+            n1.links.at[index, 'p_nom_extendable'] = False
+            n1.links.at[index, 'p_nom_max'] = n.links.at[index, 'p_nom_opt'] * 1.5
+        else:
+            n1.links.at[index, 'p_nom'] = n.links.at[index, 'p_nom_opt']
+            n1.links.at[index, 'p_nom_extendable'] = False
+
+
+def legacy_export_statistics(n, country, n_perf=0):
+    for index, row in n.generators.iterrows():
+        n.generators.at[index, 'country'] = row['bus'][:2]
+
+    for index, row in n.storage_units.iterrows():
+        n.storage_units.at[index, 'country'] = row['bus'][:2]
+
+    for index, row in n.lines.iterrows():
+        if country in row['bus0'] or country in row['bus1']:
+            n.lines.at[index, 'country'] = country
+        else:
+            n.lines.at[index, 'country'] = row['bus0'][:2]
+
+    for index, row in n.links.iterrows():
+        if country in row['bus0'] or country in row['bus1']:
+            n.links.at[index, 'country'] = country
+        else:
+            n.links.at[index, 'country'] = row['bus0'][:2]
+
+    comps = ["Generator", "StorageUnit", "Line", "Link", "Transformer"]
+    cap = n.statistics.optimal_capacity(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum").unstack().fillna(0).droplevel(0) / 1e3
+    cap.to_csv(os.path.join(os.getcwd(), f"results/cap_{n.name}.csv"))
+
+    gen = n.statistics.supply(comps=["Generator", "StorageUnit"], groupby=["carrier", "country"], aggregate_groups="sum", aggregate_time=False).fillna(0).droplevel(0) / 1e3
+    gen.to_csv(os.path.join(os.getcwd(), f"results/gen_{n.name}.csv"))
+
+    if 'roll' in n.name:
+        n_copy = n.copy()
+        n_copy.storage_units['marginal_cost'] = n_perf.storage_units['marginal_cost']
+        opex = n_copy.statistics.opex(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum").unstack().fillna(0).droplevel(0)
+    else:
+        opex = n.statistics.opex(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum").unstack().fillna(0).droplevel(0)
+
+    capex = n.statistics.capex(comps=comps, groupby=["carrier", "country"], aggregate_groups="sum").unstack().fillna(0).droplevel(0)
+    (capex / 1e9).to_csv(os.path.join(os.getcwd(), f"results/capex_{n.name}.csv"))
+
+    cost_df = pd.DataFrame(columns=n.generators.country.unique(), index=n.carriers.index)
+    for index, row in capex.iterrows():
+        for col in capex.columns:
+            cost_df.loc[index, col] = capex.loc[index, col]
+    for index, value in opex.iterrows():
+        for col in opex.columns:
+            cost_df.at[index, col] += opex.at[index, col]
+    cost_df = cost_df.dropna()
+    (cost_df / 1e9).to_csv(os.path.join(os.getcwd(), f"results/syscost_{n.name}.csv"))
+
+
+@pytest.fixture
+def expansion_network(solver):
+    """
+    Solved small network with a second German bus, expandable lines, links and batteries,
+    and the carriers of all assets.
+    """
+    n = small_network()
+    n.add('Bus', 'DE0 1', carrier='AC')
+    n.buses['country'] = n.buses.index.str[:2]
+    n.add('Load', 'DE0 1', bus='DE0 1', p_set=300)
+    n.add('Line', 'DE0 0-DE0 1', bus0='DE0 0', bus1='DE0 1', x=0.1, s_nom=100, s_nom_extendable=True, capital_cost=50, carrier='AC')
+    n.add('Link', 'DC DE0 1-FR0 0', bus0='DE0 1', bus1='FR0 0', p_nom=100, p_min_pu=-1, p_nom_extendable=True, capital_cost=80, carrier='DC')
+    n.add('Link', 'DC DE0 0-DE0 1', bus0='DE0 0', bus1='DE0 1', p_nom=50, p_min_pu=-1, p_nom_extendable=True, capital_cost=80, carrier='DC')
+    n.lines.loc['DE0 0-FR0 0', ['s_nom_extendable', 'capital_cost']] = [True, 50]
+    n.storage_units.loc['DE0 0 battery', ['p_nom_extendable', 'capital_cost']] = [True, 500]
+    carriers = pd.concat([n.df(c).carrier for c in ['Generator', 'StorageUnit', 'Line', 'Link']]).unique()
+    n.madd('Carrier', carriers)
+    optimize(n, **solver)
+    return n
+
+
+@pytest.mark.parametrize('contingency', ['pv', 'wind', 'windpv'])
+def test_contingency_cut(solved_base, contingency):
+    n, _ = solved_base
+    script = importlib.import_module(f'solve_{contingency}')
+    carriers = [c for c in script.carriers_to_cut if c in n.generators.carrier.values]
+    n_new, n_old = n.copy(), n.copy()
+    cut_start, cut_end = script.apply_contingency(n, n_new, 0.25, 3, carriers)
+    legacy_cut(n_old, legacy_columns[contingency](n_old.generators_t.p_max_pu.columns, carriers), cut_start, cut_end, 0.25)
+
+    assert not n_new.generators_t.p_max_pu.equals(n.generators_t.p_max_pu)
+    pd.testing.assert_frame_equal(n_new.generators_t.p_max_pu, n_old.generators_t.p_max_pu)
+
+
+@pytest.mark.parametrize('transform', ['no_inv', 'allow_inv', 'allow_inv_noexim'])
+def test_capacity_transform(expansion_network, transform):
+    import solve_noexim
+
+    n = expansion_network
+    n_new, n_old = n.copy(), n.copy()
+    if transform == 'no_inv':
+        no_inv(n_new, n)
+        legacy_no_inv(n_old, n)
+    elif transform == 'allow_inv':
+        allow_inv(n_new, n)
+        legacy_allow_inv(n_old, n)
+    else:
+        solve_noexim.allow_inv(n_new, n, 'DE')
+        legacy_allow_inv(n_old, n, 'DE')
+
+    for c in ['Generator', 'StorageUnit', 'Store', 'Line', 'Link', 'GlobalConstraint']:
+        pd.testing.assert_frame_equal(n_new.df(c), n_old.df(c))
+
+
+@pytest.mark.parametrize('name', ['pv_DE_0_1.0_0.25_3_inv', 'pv_DE_0_1.0_0.25_3_noinv_roll'])
+def test_export_statistics(tmp_path, monkeypatch, expansion_network, name):
+    fn = tmp_path / 'config.yaml'
+    fn.write_text(yaml.safe_dump({'results_store': 'csv'}))
+    monkeypatch.setenv('WORKFLOW_CONFIG', str(fn))
+    n_perf = expansion_network.copy()
+    n_perf.storage_units['marginal_cost'] = [2., 3., 4.]
+
+    for export, directory in [(export_statistics, 'new'), (legacy_export_statistics, 'old')]:
+        (tmp_path / directory / 'results').mkdir(parents=True)
+        monkeypatch.chdir(tmp_path / directory)
+        n = expansion_network.copy()
+        n.name = name
+        export(n, 'DE', n_perf)
+
+    for table in ['cap', 'gen', 'capex', 'syscost']:
+        new = (tmp_path / 'new' / 'results' / f'{table}_{name}.csv').read_bytes()
+        old = (tmp_path / 'old' / 'results' / f'{table}_{name}.csv').read_bytes()
+        assert new == old, table
+    assert len(pd.read_csv(tmp_path / 'new' / 'results' / f'syscost_{name}.csv')) > 1
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+pypsa = pytest.importorskip('pypsa')
+from _helpers import export_delta, load_delta, operational_cost, optimize, optimize_window
+
+
+def test_window_objective(solved_base, noinv_contingency, solver):
+    n, _ = solved_base
+    n_new, cut_start, cut_end = noinv_contingency
+    n_full = n_new.copy()
+
+    optimize_window(n_new, n, cut_start, cut_end, buffer_days=2, **solver)
+    optimize(n_full, **solver)
+
+    #the objective of the spliced dispatch, at least the full year optimum
+    assert n_new.objective == pytest.approx(operational_cost(n_new, n_new.snapshots), rel=1e-6)
+    assert n_new.objective >= n_full.objective * (1 - 1e-6)
+    assert n_new.objective == pytest.approx(n_full.objective, rel=1e-2)
+
+
+def test_window_delta_export(tmp_path, solved_base, noinv_contingency, solver):
+    n, base_file = solved_base
+    n_new, cut_start, cut_end = noinv_contingency
+    optimize_window(n_new, n, cut_start, cut_end, buffer_days=2, **solver)
+
+    fn = str(tmp_path / 'noinv.nc')
+    export_delta(n_new, n, base_file, fn)
+    n_load = load_delta(fn)
+
+    assert n_load.objective == pytest.approx(n_new.objective)
+    pd.testing.assert_frame_equal(n_load.generators_t.p, n_new.generators_t.p, check_freq=False, check_like=True, check_names=False)
+    pd.testing.assert_frame_equal(n_load.storage_units_t.state_of_charge, n_new.storage_units_t.state_of_charge, check_freq=False, check_like=True, check_names=False)
+
+
+def test_window_keeps_state_of_charge_set(solved_base, noinv_contingency, solver):
+    n, _ = solved_base
+    n_new, cut_start, cut_end = noinv_contingency
+    #a level set inside the window, the base solution does not meet it
+    sn = pd.Timestamp('2013-01-07')
+    level = n.storage_units_t.state_of_charge.loc[sn, 'DE0 0 battery'] / 2 + 300
+    n_new.storage_units_t.state_of_charge_set = pd.DataFrame({'DE0 0 battery': level}, index=[sn]).reindex(n_new.snapshots)
+    optimize_window(n_new, n, cut_start, cut_end, buffer_days=2, **solver)
+
+    assert n_new.storage_units_t.state_of_charge.loc[sn, 'DE0 0 battery'] == pytest.approx(level)
+
+
+def test_window_duals(solved_base, noinv_contingency, solver):
+    n, _ = solved_base
+    n_new, cut_start, cut_end = noinv_contingency
+    optimize_window(n_new, n, cut_start, cut_end, buffer_days=2, **solver)
+
+    #shadow prices of the base solve are not kept outside the window
+    window = (n_new.snapshots >= cut_start - pd.Timedelta(days=2)) & (n_new.snapshots <= cut_end + pd.Timedelta(days=2))
+    msv = n_new.storage_units_t.mu_energy_balance
+    assert msv[~window].isna().all().all()
+    assert msv[window].notna().all().all()
+    assert n_new.buses_t.marginal_price[~window].isna().all().all()